@@ -1,15 +1,23 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 from bson import ObjectId
 
-from app.models.schemas import PositionUpdate, PositionResponse
+from app.config import settings
+from app.models.schemas import Position, PositionUpdate, PositionResponse
+from app.serialization import JSONResponse, loads
 from app.database import mongodb, redis_client
+from app.services.cell_codec import decode_position, encode_raw_data
+from app.services.live_positions import live_positions
+from app.services.position_history import position_history
+from app.services.position_rollups import position_rollups
+from app.services.position_writer import position_writer
 from app.services.positioning import positioning_engine
 from app.services.route_tracking import route_tracking_service
 from app.services.websocket_manager import manager
 import logging
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -25,111 +33,40 @@ async def create_position_update(update: PositionUpdate):
         logger.info(f"Received position update from vehicle: {update.vehicle_id}")
         
         # Estimate position using positioning engine (now with OpenCellID integration)
-        estimated_position = None
-        accuracy = 0
-        method = "none"
-        
-        # Try to estimate position from cellular data
         position, accuracy, method = await positioning_engine.estimate_position(
             update.raw_data.cells
         )
         
-        if position:
-            estimated_position = {
-                "type": "Point",
-                "coordinates": [position.lon, position.lat]  # GeoJSON: [lon, lat]
-            }
-        elif update.position:
-            # Fallback to provided position (demo mode)
-            estimated_position = {
-                "type": "Point",
-                "coordinates": [update.position.lon, update.position.lat]
-            }
-            accuracy = 50  # Demo mode has perfect accuracy
-            method = "demo_mode"
+        estimated_position, accuracy, method = resolve_estimate(update, position, accuracy, method)
         
         # Save to MongoDB
-        position_doc = {
-            "vehicle_id": update.vehicle_id,
-            "route_id": update.route_id,
-            "timestamp": datetime.fromisoformat(update.timestamp.replace('Z', '+00:00')),
-            "raw_data": {
-                "cells": [cell.dict() for cell in update.raw_data.cells],
-                "mcc": update.raw_data.mcc,
-                "mnc": update.raw_data.mnc
-            },
-            "estimated_position": estimated_position,
-            "accuracy": accuracy,
-            "method": method,
-            "device_type": update.device_type,
-            "created_at": datetime.utcnow()
-        }
-        
-        result = await mongodb.db.positions.insert_one(position_doc)
+        position_doc = build_position_doc(update, estimated_position, accuracy, method)
+        position_id = await position_writer.write(position_doc)
         
         # Cache current position in Redis
+        applied = True
         if redis_client.client and estimated_position:
-            cache_key = f"vehicle:position:{update.vehicle_id}"
-            cache_data = {
-                "vehicle_id": update.vehicle_id,
-                "position": estimated_position,
-                "accuracy": accuracy,
-                "method": method,
-                "timestamp": update.timestamp
-            }
-            
             try:
-                await redis_client.client.setex(
-                    cache_key,
-                    300,  # 5 minutes
-                    json.dumps(cache_data)
-                )
+                applied = await live_positions.cache(live_positions.payload(
+                    update.vehicle_id, update.route_id, estimated_position,
+                    accuracy, method, update.timestamp
+                ))
             except Exception as e:
                 logger.warning(f"Redis cache error: {e}")
         
-        # Process with Route Tracking Service for passenger-friendly data
-        if estimated_position:
-            position_coords = {
-                "lat": estimated_position["coordinates"][1],  # GeoJSON is [lon, lat]
-                "lon": estimated_position["coordinates"][0]
-            }
-            
-            passenger_data = await route_tracking_service.process_position_update(
-                vehicle_id=update.vehicle_id,
-                route_id=update.route_id,
-                position=position_coords,
-                accuracy=accuracy,
-                method=method,
-                timestamp=update.timestamp,
-                raw_data=update.raw_data.dict() if update.raw_data else None
-            )
-            
-            # Broadcast passenger-friendly data to WebSocket clients
-            await manager.broadcast(passenger_data)
-            
-            logger.info(f"Position saved: {method}, accuracy: {accuracy}m, stop: {passenger_data.get('current_stop', 'unknown')}")
-        else:
-            # Fallback broadcast if no position
-            broadcast_data = {
-                "type": "position_update",
-                "vehicle_id": update.vehicle_id,
-                "route_id": update.route_id,
-                "error": "No position calculated",
-                "timestamp": update.timestamp
-            }
-            await manager.broadcast(broadcast_data)
-            
-            logger.info(f"Position saved: {method}, no location calculated")
+        # An out-of-order update must not move the vehicle backwards for clients
+        if applied:
+            await publish_update(update, estimated_position, accuracy, method)
         
         return {
-            "id": str(result.inserted_id),
+            "id": str(position_id),
             "vehicle_id": update.vehicle_id,
             "estimated_position": estimated_position,
             "accuracy": accuracy,
             "method": method,
             "status": "success"
         }
-        
+    
     except Exception as e:
         logger.error(f"Error processing position update: {e}")
         raise HTTPException(
@@ -137,6 +74,220 @@ async def create_position_update(update: PositionUpdate):
             detail=f"Error processing position: {str(e)}"
         )
 
+@router.post("/batch", status_code=status.HTTP_201_CREATED)
+async def create_position_updates_batch(request: Request):
+    """
+    Receive buffered position updates from a driver app in one request
+    Body: a JSON array of updates, or NDJSON (one update per line)
+    Towers are resolved once for the whole batch, positions are written with
+    one insert_many and each vehicle's current position is cached once
+    (latest timestamp wins)
+    """
+    
+    body = await request.body()
+    
+    try:
+        if "ndjson" in request.headers.get("content-type", "") or not body.lstrip().startswith(b"["):
+            items = [loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = loads(body)
+        if not isinstance(items, list):
+            raise ValueError("expected an array of updates")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid batch body: {str(e)}"
+        )
+    
+    if len(items) > settings.POSITION_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch limited to {settings.POSITION_BATCH_MAX_ITEMS} updates"
+        )
+    
+    # Validate every item; bad items are reported, not fatal
+    results: List[Dict] = [None] * len(items)
+    updates = []  # (index, update)
+    for i, item in enumerate(items):
+        try:
+            update = PositionUpdate.model_validate(item)
+            parse_timestamp(update.timestamp)
+            updates.append((i, update))
+        except (ValidationError, ValueError, TypeError) as e:
+            results[i] = {"index": i, "status": "error", "error": str(e)}
+    
+    logger.info(f"Received position batch: {len(items)} updates, {len(updates)} valid")
+    
+    try:
+        estimates = await positioning_engine.estimate_positions_batch(
+            [update.raw_data.cells for _, update in updates]
+        )
+        
+        docs = []
+        for (i, update), (position, accuracy, method) in zip(updates, estimates):
+            estimated_position, accuracy, method = resolve_estimate(update, position, accuracy, method)
+            docs.append(build_position_doc(update, estimated_position, accuracy, method))
+        
+        # Save to MongoDB in one round-trip (or hand off to the write-behind queue)
+        for doc, position_id in zip(docs, await position_writer.write_many(docs)):
+            doc["_id"] = position_id
+        
+        # Latest update per vehicle
+        latest = {}
+        for (i, update), doc in zip(updates, docs):
+            current = latest.get(update.vehicle_id)
+            if current is None or doc["timestamp"].timestamp() >= current[1]["timestamp"].timestamp():
+                latest[update.vehicle_id] = (update, doc)
+        
+        # Cache current positions in Redis
+        stale = set()
+        if redis_client.client:
+            located = [(update, doc) for update, doc in latest.values() if doc["estimated_position"]]
+            try:
+                applied = await live_positions.cache_many([
+                    live_positions.payload(
+                        update.vehicle_id, update.route_id, doc["estimated_position"],
+                        doc["accuracy"], doc["method"], update.timestamp
+                    )
+                    for update, doc in located
+                ])
+                stale = {update.vehicle_id for (update, doc), ok in zip(located, applied) if not ok}
+            except Exception as e:
+                logger.warning(f"Redis cache error: {e}")
+        
+        # Skip vehicles whose cached position is newer than this batch
+        for update, doc in latest.values():
+            if update.vehicle_id not in stale:
+                await publish_update(update, doc["estimated_position"], doc["accuracy"], doc["method"])
+        
+        for (i, update), doc in zip(updates, docs):
+            results[i] = {
+                "index": i,
+                "id": str(doc["_id"]),
+                "vehicle_id": update.vehicle_id,
+                "estimated_position": doc["estimated_position"],
+                "accuracy": doc["accuracy"],
+                "method": doc["method"],
+                "status": "success"
+            }
+        
+        return {
+            "count": len(items),
+            "accepted": len(docs),
+            "rejected": len(items) - len(docs),
+            "results": results
+        }
+    
+    except Exception as e:
+        logger.error(f"Error processing position batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing position batch: {str(e)}"
+        )
+
+def resolve_estimate(
+    update: PositionUpdate,
+    position: Optional[Position],
+    accuracy: float,
+    method: str
+) -> Tuple[Optional[Dict], float, str]:
+    """
+    GeoJSON point for an estimate, falling back to the position the
+    device sent (demo mode)
+    Returns: (estimated_position, accuracy, method)
+    """
+    
+    if position:
+        estimated_position = {
+            "type": "Point",
+            "coordinates": [position.lon, position.lat]  # GeoJSON: [lon, lat]
+        }
+    elif update.position:
+        # Fallback to provided position (demo mode)
+        estimated_position = {
+            "type": "Point",
+            "coordinates": [update.position.lon, update.position.lat]
+        }
+        accuracy = 50  # Demo mode has perfect accuracy
+        method = "demo_mode"
+    else:
+        estimated_position = None
+    
+    return estimated_position, accuracy, method
+
+def build_position_doc(
+    update: PositionUpdate,
+    estimated_position: Optional[Dict],
+    accuracy: float,
+    method: str
+) -> Dict:
+    """Position document as stored in MongoDB"""
+    
+    raw_data = {
+        "cells": [cell.dict() for cell in update.raw_data.cells],
+        "mcc": update.raw_data.mcc,
+        "mnc": update.raw_data.mnc
+    }
+    if settings.POSITION_CELLS_COMPACT:
+        raw_data = encode_raw_data(raw_data)
+    
+    return {
+        "vehicle_id": update.vehicle_id,
+        "route_id": update.route_id,
+        "timestamp": parse_timestamp(update.timestamp),
+        "raw_data": raw_data,
+        "estimated_position": estimated_position,
+        "accuracy": accuracy,
+        "method": method,
+        "device_type": update.device_type,
+        "created_at": datetime.utcnow()
+    }
+
+def parse_timestamp(timestamp: str) -> datetime:
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+async def publish_update(
+    update: PositionUpdate,
+    estimated_position: Optional[Dict],
+    accuracy: float,
+    method: str
+):
+    """Hand an update to the WebSocket event bus (fan-out happens off the request path)"""
+    
+    # Process with Route Tracking Service for passenger-friendly data
+    if estimated_position:
+        position_coords = {
+            "lat": estimated_position["coordinates"][1],  # GeoJSON is [lon, lat]
+            "lon": estimated_position["coordinates"][0]
+        }
+        
+        passenger_data = await route_tracking_service.process_position_update(
+            vehicle_id=update.vehicle_id,
+            route_id=update.route_id,
+            position=position_coords,
+            accuracy=accuracy,
+            method=method,
+            timestamp=update.timestamp,
+            raw_data=update.raw_data.dict() if update.raw_data else None
+        )
+        
+        # Broadcast passenger-friendly data to WebSocket clients
+        manager.publish(passenger_data)
+        
+        logger.info(f"Position saved: {method}, accuracy: {accuracy}m, stop: {passenger_data.get('current_stop', 'unknown')}")
+    else:
+        # Fallback broadcast if no position
+        broadcast_data = {
+            "type": "position_update",
+            "vehicle_id": update.vehicle_id,
+            "route_id": update.route_id,
+            "error": "No position calculated",
+            "timestamp": update.timestamp
+        }
+        manager.publish(broadcast_data)
+        
+        logger.info(f"Position saved: {method}, no location calculated")
+
 @router.get("/vehicle/{vehicle_id}")
 async def get_vehicle_positions(
     vehicle_id: str,
@@ -155,13 +306,14 @@ async def get_vehicle_positions(
         for pos in positions:
             pos["_id"] = str(pos["_id"])
             pos["timestamp"] = pos["timestamp"].isoformat()
+            decode_position(pos)
         
-        return {
+        return JSONResponse({
             "vehicle_id": vehicle_id,
             "count": len(positions),
             "positions": positions
-        }
-        
+        })
+    
     except Exception as e:
         logger.error(f"Error fetching positions: {e}")
         raise HTTPException(
@@ -169,6 +321,113 @@ async def get_vehicle_positions(
             detail=str(e)
         )
 
+@router.get("/history/{vehicle_id}")
+async def get_position_history(
+    request: Request,
+    vehicle_id: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$")
+):
+    """
+    Get a vehicle's positions between from and to, oldest first
+    json: one page per call, continue with after=<next>
+    ndjson/csv: the whole range streamed from the cursor (gzipped if accepted)
+    fields: comma-separated projection (raw_data is excluded by default)
+    """
+    
+    try:
+        selected = position_history.parse_fields(fields)
+        if after:
+            position_history.decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if format == "json":
+        try:
+            return JSONResponse(await position_history.page(vehicle_id, from_, to, after, selected, limit))
+        except Exception as e:
+            logger.error(f"Error fetching position history: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+    
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"Content-Disposition": f'attachment; filename="{vehicle_id}.{format}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    
+    return StreamingResponse(
+        position_history.stream(vehicle_id, from_, to, after, selected, format, compress),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers=headers
+    )
+
+@router.get("/rollups/{vehicle_id}")
+async def get_position_rollups(
+    vehicle_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    interval_minutes: int = Query(1, ge=1, le=1440)
+):
+    """Get per-minute (or coarser) position summaries for a vehicle, last 24h by default"""
+    
+    if not settings.POSITION_ROLLUPS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Position rollups are disabled"
+        )
+    
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    
+    try:
+        buckets = await position_rollups.query(vehicle_id, start, end, interval_minutes)
+        
+        return JSONResponse({
+            "vehicle_id": vehicle_id,
+            "interval_minutes": interval_minutes,
+            "count": len(buckets),
+            "rollups": buckets
+        })
+    
+    except Exception as e:
+        logger.error(f"Error fetching position rollups: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/current")
+async def get_fleet_positions(
+    route_id: Optional[str] = None,
+    vehicle_ids: Optional[str] = None
+):
+    """
+    Get current positions of the whole fleet, one route, or a comma-separated
+    list of vehicles, in one call
+    """
+    
+    try:
+        vehicles = [v.strip() for v in vehicle_ids.split(",") if v.strip()] if vehicle_ids else None
+        positions = await live_positions.snapshot(route_id=route_id, vehicle_ids=vehicles)
+        
+        return JSONResponse({"count": len(positions), "positions": positions})
+    
+    except Exception as e:
+        logger.error(f"Error fetching fleet positions: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @router.get("/current/{vehicle_id}")
 async def get_current_position(vehicle_id: str):
     """Get current position of a vehicle (from Redis cache or MongoDB)"""
@@ -176,11 +435,11 @@ async def get_current_position(vehicle_id: str):
     try:
         # Try Redis first
         if redis_client.client:
-            cache_key = f"vehicle:position:{vehicle_id}"
+            cache_key = live_positions.vehicle_key(vehicle_id)
             try:
                 cached = await redis_client.client.get(cache_key)
                 if cached:
-                    return json.loads(cached)
+                    return loads(cached)
             except Exception as e:
                 logger.warning(f"Redis error: {e}")
         
@@ -197,10 +456,11 @@ async def get_current_position(vehicle_id: str):
             )
         
         position["_id"] = str(position["_id"])
+        decode_position(position)
         position["timestamp"] = position["timestamp"].isoformat()
         
         return position
-        
+    
     except HTTPException:
         raise
     except Exception as e:
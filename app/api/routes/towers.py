@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 from app.models.schemas import Tower
 from app.database import mongodb
+from app.services.tower_index import tower_index
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Bounds for proximity queries; an unbounded radius scans the whole index
+MAX_RADIUS_METERS = 100000
+MAX_RESULTS = 1000
+
 @router.get("/")
 async def get_all_towers(limit: int = 100):
     """Get all cached towers"""
@@ -28,8 +33,18 @@ async def get_all_towers(limit: int = 100):
         )
 
 @router.get("/nearby")
-async def get_nearby_towers(lat: float, lon: float, radius_meters: int = 5000):
-    """Get towers near a location"""
+async def get_nearby_towers(
+    lat: float,
+    lon: float,
+    radius_meters: int = Query(5000, gt=0, le=MAX_RADIUS_METERS),
+    limit: int = Query(50, gt=0, le=MAX_RESULTS)
+):
+    """Get towers near a location, nearest first"""
+    
+    # Served from the in-process index once it's loaded
+    if tower_index.loaded:
+        towers = tower_index.within_radius(lat, lon, radius_meters, limit=limit)
+        return {"count": len(towers), "towers": towers}
     
     try:
         # GeoJSON query
@@ -43,7 +58,7 @@ async def get_nearby_towers(lat: float, lon: float, radius_meters: int = 5000):
                     "$maxDistance": radius_meters
                 }
             }
-        }).to_list(length=50)
+        }).to_list(length=limit)
         
         for tower in towers:
             tower["_id"] = str(tower["_id"])
@@ -56,3 +71,41 @@ async def get_nearby_towers(lat: float, lon: float, radius_meters: int = 5000):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+@router.get("/nearest")
+async def get_nearest_towers(
+    lat: float,
+    lon: float,
+    k: int = Query(5, gt=0, le=MAX_RESULTS),
+    max_radius_meters: int = Query(50000, gt=0, le=MAX_RADIUS_METERS)
+):
+    """Get the k towers closest to a location"""
+    
+    if tower_index.loaded:
+        towers = tower_index.nearest(lat, lon, k, max_radius_meters)
+        return {"count": len(towers), "towers": towers}
+    
+    try:
+        towers = await mongodb.db.towers.find({
+            "location": {
+                "$near": {
+                    "$geometry": {
+                        "type": "Point",
+                        "coordinates": [lon, lat]
+                    },
+                    "$maxDistance": max_radius_meters
+                }
+            }
+        }).to_list(length=k)
+        
+        for tower in towers:
+            tower["_id"] = str(tower["_id"])
+        
+        return {"count": len(towers), "towers": towers}
+        
+    except Exception as e:
+        logger.error(f"Error fetching nearest towers: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 from datetime import datetime
+from typing import Optional
 from app.models.schemas import Vehicle
 from app.database import mongodb
+from app.services.live_positions import live_positions
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Bounds for proximity queries; an unbounded radius searches the whole fleet
+MAX_RADIUS_METERS = 100000
+MAX_RESULTS = 1000
+
 @router.get("/")
 async def get_all_vehicles():
     """Get all vehicles"""
@@ -35,6 +41,26 @@ async def get_all_vehicles():
             detail=str(e)
         )
 
+@router.get("/nearby")
+async def get_nearby_vehicles(
+    lat: float,
+    lon: float,
+    radius_meters: int = Query(1000, gt=0, le=MAX_RADIUS_METERS),
+    k: Optional[int] = Query(None, gt=0, le=MAX_RESULTS)
+):
+    """Get live vehicles near a location, nearest first (k nearest when k is set)"""
+    
+    try:
+        vehicles = await live_positions.nearby(lat, lon, radius_meters, k)
+        return {"count": len(vehicles), "vehicles": vehicles}
+        
+    except Exception as e:
+        logger.error(f"Error fetching nearby vehicles: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @router.get("/{device_id}")
 async def get_vehicle(device_id: str):
     """Get specific vehicle"""
@@ -18,6 +18,66 @@ class Settings(BaseSettings):
     
     # OpenCellID
     OPENCELLID_API_KEY: str = os.getenv("OPENCELLID_API_KEY", "")
+    OPENCELLID_TABLE_PATH: str = os.getenv("OPENCELLID_TABLE_PATH", "")  # Offline tower table (tower_table.py)
+    OPENCELLID_TABLE_RELOAD_SECONDS: float = float(os.getenv("OPENCELLID_TABLE_RELOAD_SECONDS", "60"))  # Rebuild check interval
+    
+    # Upstream HTTP (shared pool + OpenCellID circuit breaker)
+    HTTP_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_TIMEOUT_SECONDS", "3.0"))
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "1.0"))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    OPENCELLID_BREAKER_FAILURES: int = int(os.getenv("OPENCELLID_BREAKER_FAILURES", "5"))
+    OPENCELLID_BREAKER_RESET_SECONDS: float = float(os.getenv("OPENCELLID_BREAKER_RESET_SECONDS", "30"))
+    
+    # Positioning
+    POSITION_MEMO_SIZE: int = int(os.getenv("POSITION_MEMO_SIZE", "10000"))
+    POSITION_MEMO_TTL_SECONDS: float = float(os.getenv("POSITION_MEMO_TTL_SECONDS", "60"))
+    POSITION_MEMO_RSSI_BUCKET_DB: int = int(os.getenv("POSITION_MEMO_RSSI_BUCKET_DB", "4"))
+    POSITIONING_EXECUTOR: str = os.getenv("POSITIONING_EXECUTOR", "inline")  # inline | thread | process
+    POSITIONING_WORKERS: int = int(os.getenv("POSITIONING_WORKERS", "0"))  # 0 = CPU count
+    POSITIONING_QUEUE_SIZE: int = int(os.getenv("POSITIONING_QUEUE_SIZE", "64"))
+    CURRENT_POSITION_TTL_SECONDS: int = int(os.getenv("CURRENT_POSITION_TTL_SECONDS", "300"))
+    POSITION_BATCH_MAX_ITEMS: int = int(os.getenv("POSITION_BATCH_MAX_ITEMS", "1000"))
+    
+    # Position write-behind (queue inserts and flush them in batches)
+    POSITION_WRITE_BEHIND: bool = os.getenv("POSITION_WRITE_BEHIND", "False").lower() == "true"
+    POSITION_WRITE_QUEUE_SIZE: int = int(os.getenv("POSITION_WRITE_QUEUE_SIZE", "10000"))
+    POSITION_WRITE_BATCH_SIZE: int = int(os.getenv("POSITION_WRITE_BATCH_SIZE", "500"))
+    POSITION_WRITE_FLUSH_SECONDS: float = float(os.getenv("POSITION_WRITE_FLUSH_SECONDS", "0.25"))
+    POSITION_WRITE_MAX_RETRIES: int = int(os.getenv("POSITION_WRITE_MAX_RETRIES", "5"))
+    POSITION_WRITE_DRAIN_SECONDS: float = float(os.getenv("POSITION_WRITE_DRAIN_SECONDS", "30"))
+    TOWER_LOOKUP_CONCURRENCY: int = int(os.getenv("TOWER_LOOKUP_CONCURRENCY", "8"))
+    TOWER_LOOKUP_DEADLINE_SECONDS: float = float(os.getenv("TOWER_LOOKUP_DEADLINE_SECONDS", "3.0"))
+    TOWER_DENSITY_K: int = int(os.getenv("TOWER_DENSITY_K", "4"))
+    TOWER_DENSITY_CACHE_SIZE: int = int(os.getenv("TOWER_DENSITY_CACHE_SIZE", "50000"))
+    
+    # Tower cache (in-process L1 in front of Redis and MongoDB)
+    TOWER_CACHE_SIZE: int = int(os.getenv("TOWER_CACHE_SIZE", "200000"))
+    TOWER_CACHE_TTL_SECONDS: float = float(os.getenv("TOWER_CACHE_TTL_SECONDS", "21600"))
+    TOWER_WARMUP_BBOXES: str = os.getenv("TOWER_WARMUP_BBOXES", "")  # "min_lat,min_lon,max_lat,max_lon;..."
+    ROUTE_PREFETCH_ENABLED: bool = os.getenv("ROUTE_PREFETCH_ENABLED", "True").lower() == "true"
+    ROUTE_PREFETCH_BUFFER_METERS: float = float(os.getenv("ROUTE_PREFETCH_BUFFER_METERS", "2000"))
+    ROUTE_PREFETCH_INTERVAL_SECONDS: float = float(os.getenv("ROUTE_PREFETCH_INTERVAL_SECONDS", "900"))
+    
+    # Unknown tower tombstones (re-check back-off doubles per miss)
+    UNKNOWN_TOWER_BASE_TTL_SECONDS: int = int(os.getenv("UNKNOWN_TOWER_BASE_TTL_SECONDS", "3600"))
+    UNKNOWN_TOWER_MAX_TTL_SECONDS: int = int(os.getenv("UNKNOWN_TOWER_MAX_TTL_SECONDS", "604800"))
+    UNKNOWN_TOWER_CACHE_SIZE: int = int(os.getenv("UNKNOWN_TOWER_CACHE_SIZE", "100000"))
+    
+    # Tower spatial index (serves /towers/nearby and /towers/nearest in-process)
+    TOWER_INDEX_ENABLED: bool = os.getenv("TOWER_INDEX_ENABLED", "True").lower() == "true"
+    TOWER_INDEX_CELL_DEGREES: float = float(os.getenv("TOWER_INDEX_CELL_DEGREES", "0.01"))  # ~1.1 km
+    
+    # Position storage (time-series mode needs MongoDB 5.0+, set before the collection exists)
+    POSITIONS_TIMESERIES: bool = os.getenv("POSITIONS_TIMESERIES", "False").lower() == "true"
+    POSITIONS_EXPIRE_AFTER_SECONDS: int = int(os.getenv("POSITIONS_EXPIRE_AFTER_SECONDS", "0"))  # 0 = keep
+    POSITION_ROLLUPS: bool = os.getenv("POSITION_ROLLUPS", "False").lower() == "true"
+    POSITION_ROLLUP_EXPIRE_SECONDS: int = int(os.getenv("POSITION_ROLLUP_EXPIRE_SECONDS", "0"))  # 0 = keep
+    POSITION_CELLS_COMPACT: bool = os.getenv("POSITION_CELLS_COMPACT", "False").lower() == "true"  # Packed raw_data.cells
+    
+    # WebSocket fan-out
+    WS_EVENT_QUEUE_SIZE: int = int(os.getenv("WS_EVENT_QUEUE_SIZE", "1000"))
+    WS_CLIENT_QUEUE_SIZE: int = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "100"))  # Per connection, oldest dropped
     
     # Server
     HOST: str = os.getenv("HOST", "0.0.0.0")
@@ -48,12 +48,46 @@ class MongoDB:
         return False
     
     async def create_indexes(self):
-        """Create database indexes"""
+        """Create database indexes (each group separately, so one failure doesn't skip the rest)"""
+        if settings.POSITIONS_TIMESERIES:
+            try:
+                await self.create_positions_timeseries()
+            except Exception as e:
+                logger.error(f"Error creating time-series positions collection: {e}")
+        
+        # Positions collection, one index at a time: in time-series mode,
+        # indexes on measurement fields need MongoDB 6.0+
+        for keys in (
+            [("vehicle_id", 1), ("timestamp", -1)],
+            [("route_id", 1), ("timestamp", -1)],
+            # Whole-fleet latest-position fallback: recent positions, newest first
+            [("timestamp", -1)],
+            # Keyset-paginated history: sorted by (timestamp, _id) per vehicle
+            [("vehicle_id", 1), ("timestamp", 1), ("_id", 1)],
+            # 2dsphere index for geospatial queries
+            [("estimated_position", "2dsphere")],
+        ):
+            try:
+                await self.db.positions.create_index(keys)
+            except Exception as e:
+                if settings.POSITIONS_TIMESERIES:
+                    logger.warning(f"Skipping positions index {keys} in time-series mode: {e}")
+                else:
+                    logger.error(f"Error creating positions index {keys}: {e}")
+        
+        try:
+            # Per-vehicle minute rollups
+            await self.db.position_rollups.create_index(
+                [("vehicle_id", 1), ("minute", 1)], unique=True
+            )
+            if settings.POSITION_ROLLUP_EXPIRE_SECONDS:
+                await self.db.position_rollups.create_index(
+                    "minute", expireAfterSeconds=settings.POSITION_ROLLUP_EXPIRE_SECONDS
+                )
+        except Exception as e:
+            logger.error(f"Error creating position_rollups indexes: {e}")
+        
         try:
-            # Positions collection - 2dsphere index for geospatial queries
-            await self.db.positions.create_index([("estimated_position", "2dsphere")])
-            await self.db.positions.create_index([("vehicle_id", 1), ("timestamp", -1)])
-            
             # Vehicles collection
             await self.db.vehicles.create_index("device_id", unique=True)
             
@@ -64,9 +98,44 @@ class MongoDB:
             await self.db.towers.create_index([("location", "2dsphere")])
             await self.db.towers.create_index([("cid", 1), ("lac", 1), ("mcc", 1), ("mnc", 1)])
             
+            # Unknown tower tombstones - purged once past their re-check window
+            await self.db.unknown_towers.create_index(
+                [("mcc", 1), ("mnc", 1), ("lac", 1), ("cid", 1)], unique=True
+            )
+            await self.db.unknown_towers.create_index("expires_at", expireAfterSeconds=0)
+            
             logger.info("Database indexes created")
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
+    
+    async def create_positions_timeseries(self):
+        """Create positions as a time-series collection (MongoDB 5.0+)"""
+        
+        expire = settings.POSITIONS_EXPIRE_AFTER_SECONDS
+        existing = await self.db.list_collections(filter={"name": "positions"}).to_list(length=1)
+        
+        if not existing:
+            options = {
+                "timeseries": {
+                    "timeField": "timestamp",
+                    "metaField": "vehicle_id",
+                    "granularity": "seconds"
+                }
+            }
+            if expire:
+                options["expireAfterSeconds"] = expire
+            
+            await self.db.create_collection("positions", **options)
+            logger.info("Created time-series positions collection")
+        
+        elif existing[0].get("type") != "timeseries":
+            # A plain collection can't be converted in place
+            logger.warning(
+                "positions is a regular collection; migrate it to use time-series mode"
+            )
+        
+        elif expire:
+            await self.db.command("collMod", "positions", expireAfterSeconds=expire)
 
 class RedisClient:
     client: redis.Redis = None
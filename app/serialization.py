@@ -0,0 +1,41 @@
+"""
+Serialization
+One JSON encoder/decoder (orjson) for HTTP responses, WebSocket frames and
+Redis payloads, with native datetime, ObjectId and numpy support
+"""
+from typing import Any
+from bson import ObjectId
+from fastapi.responses import JSONResponse as BaseJSONResponse
+import orjson
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def default(obj: Any) -> Any:
+    """Types orjson doesn't handle natively"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes (Redis values, HTTP bodies)"""
+    return orjson.dumps(obj, default=default, option=OPTIONS)
+
+def dumps_str(obj: Any) -> str:
+    """Serialize to a JSON string (WebSocket text frames)"""
+    return dumps(obj).decode()
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str; errors are ValueError subclasses"""
+    return orjson.loads(data)
+
+class JSONResponse(BaseJSONResponse):
+    """
+    JSONResponse rendered with orjson
+    Endpoints returning large bodies should return it directly so FastAPI
+    skips its jsonable_encoder pass over the content
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,97 @@
+"""
+Cell Scan Codec
+Compact storage form of raw_data.cells: fixed-width packed records in one
+BSON binary field, with mcc/mnc hoisted to the scan
+"""
+import struct
+from typing import Any, Dict, List, Optional
+from bson import Binary
+
+ENCODING = "cells_v1"
+
+# cid, lac, rssi, ta (-1 = none), distance (-1 = none), type code
+CELL = struct.Struct("<IIhhiB")
+
+TYPE_CODES = {None: 0, "GSM": 1, "LTE": 2, "WCDMA": 3, "NR": 4, "CDMA": 5}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+def encode_raw_data(raw_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pack a raw_data dict ({"cells": [...], "mcc", "mnc"}) into the compact form
+    Returns: the compact dict, or raw_data unchanged when the scan can't be
+    packed (mixed networks, unknown radio types, out-of-range values)
+    """
+    
+    cells = raw_data.get("cells") or []
+    packed = pack_cells(cells)
+    if packed is None:
+        return raw_data
+    
+    compact = {
+        "encoding": ENCODING,
+        "mcc": cells[0]["mcc"] if cells else raw_data.get("mcc"),
+        "mnc": cells[0]["mnc"] if cells else raw_data.get("mnc"),
+        "cells_bin": Binary(packed)
+    }
+    
+    # Scan-level mcc/mnc only when they differ from the cells' network
+    for field in ("mcc", "mnc"):
+        if raw_data.get(field) != compact[field]:
+            compact[f"scan_{field}"] = raw_data.get(field)
+    
+    return compact
+
+def pack_cells(cells: List[Dict[str, Any]]) -> Optional[bytes]:
+    if cells and len({(cell["mcc"], cell["mnc"]) for cell in cells}) > 1:
+        return None
+    
+    records = []
+    try:
+        for cell in cells:
+            if cell.get("type") not in TYPE_CODES:
+                return None
+            records.append(CELL.pack(
+                cell["cid"],
+                cell["lac"],
+                cell["rssi"],
+                -1 if cell.get("ta") is None else cell["ta"],
+                -1 if cell.get("distance") is None else cell["distance"],
+                TYPE_CODES[cell.get("type")]
+            ))
+    except struct.error:
+        return None
+    
+    return b"".join(records)
+
+def decode_raw_data(raw_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Expand a stored raw_data dict to the verbose form (verbose input passes through)"""
+    
+    if not raw_data or raw_data.get("encoding") != ENCODING:
+        return raw_data
+    
+    mcc, mnc = raw_data["mcc"], raw_data["mnc"]
+    cells = [
+        {
+            "cid": cid,
+            "lac": lac,
+            "mcc": mcc,
+            "mnc": mnc,
+            "rssi": rssi,
+            "ta": None if ta == -1 else ta,
+            "type": TYPE_NAMES[type_code],
+            "distance": None if distance == -1 else distance
+        }
+        for cid, lac, rssi, ta, distance, type_code in CELL.iter_unpack(bytes(raw_data["cells_bin"]))
+    ]
+    
+    return {
+        "cells": cells,
+        "mcc": raw_data.get("scan_mcc", mcc),
+        "mnc": raw_data.get("scan_mnc", mnc)
+    }
+
+def decode_position(position: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode raw_data of a stored position document in place"""
+    if "raw_data" in position:
+        position["raw_data"] = decode_raw_data(position["raw_data"])
+    return position
@@ -0,0 +1,107 @@
+"""
+Compute Pool
+Runs CPU-bound positioning work inline, in a thread pool or in a process pool
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ComputePool:
+    """
+    Executes numeric work off the event loop
+    Modes: "inline" (on the event loop), "thread" or "process"
+    At most queue_size jobs are submitted at once; further callers wait
+    """
+    
+    MODES = ("inline", "thread", "process")
+    
+    def __init__(self):
+        self.mode = settings.POSITIONING_EXECUTOR.lower()
+        self.max_workers = settings.POSITIONING_WORKERS or os.cpu_count() or 1
+        self.queue_size = settings.POSITIONING_QUEUE_SIZE
+        
+        self.executor: Optional[Executor] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+    
+    def start(self):
+        """Create the worker pool for the configured mode"""
+        
+        if self.mode not in self.MODES:
+            logger.warning(f"Unknown POSITIONING_EXECUTOR '{self.mode}', using inline")
+            self.mode = "inline"
+        
+        if self.mode == "thread":
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="positioning"
+            )
+        elif self.mode == "process":
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        
+        self.slots = asyncio.Semaphore(self.queue_size)
+        logger.info(f"Positioning compute pool: {self.mode} ({self.max_workers} workers)")
+    
+    async def shutdown(self):
+        """Stop the worker pool, dropping jobs that have not started"""
+        
+        if self.executor:
+            executor, self.executor = self.executor, None
+            # Waiting for in-flight jobs must not block the event loop
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+            logger.info("Positioning compute pool stopped")
+    
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) according to the pool mode and return its result"""
+        
+        if self.executor is None:
+            return fn(*args)
+        
+        loop = asyncio.get_running_loop()
+        
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        
+        self.in_flight += 1
+        try:
+            result = await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool counters"""
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers if self.executor else 0,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+# Global instance
+compute_pool = ComputePool()
@@ -0,0 +1,156 @@
+"""
+Shared HTTP Client
+One connection-pooled httpx client for upstream APIs, owned by the app
+lifespan, and a circuit breaker that fails fast while an upstream is sick
+"""
+import asyncio
+import time
+import httpx
+from typing import Any, Dict, Optional
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    closed: requests flow, consecutive failures are counted
+    open: requests fail fast until reset_timeout has passed
+    half_open: a single probe request decides between closed and open
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        
+        self.rejected = 0
+        self.trips = 0
+    
+    def allow(self) -> bool:
+        """Whether a request may go upstream now"""
+        
+        if self.state == self.CLOSED:
+            return True
+        
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.probing = False
+            logger.info(f"Circuit {self.name} half-open, probing upstream")
+        
+        if self.state == self.HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        
+        self.rejected += 1
+        return False
+    
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(
+                    f"Circuit {self.name} open after {self.failures} failures, "
+                    f"failing fast for {self.reset_timeout}s"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probing = False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state and counters"""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
+
+class HTTPClient:
+    """Lazily created, shared httpx.AsyncClient"""
+    
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+    
+    def get_client(self) -> httpx.AsyncClient:
+        """The shared client, created on first use"""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.HTTP_TIMEOUT_SECONDS,
+                    connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS
+                )
+            )
+        return self.client
+    
+    def start(self):
+        self.get_client()
+        logger.info("✅ HTTP client pool ready")
+    
+    async def close(self):
+        if self.client is not None:
+            client, self.client = self.client, None
+            await client.aclose()
+    
+    async def get(self, url: str, breaker: CircuitBreaker, **kwargs) -> Optional[httpx.Response]:
+        """
+        GET through the shared pool, guarded by a circuit breaker
+        Timeouts, connection errors, 429 and 5xx count as failures
+        Returns: the response, or None when the circuit is open or the request failed
+        """
+        
+        if not breaker.allow():
+            logger.debug(f"Circuit {breaker.name} open, skipping request")
+            return None
+        
+        try:
+            response = await self.get_client().get(url, **kwargs)
+        except asyncio.CancelledError:
+            # Caller gave up (deadline); doesn't say anything about the upstream
+            if breaker.probing:
+                breaker.probing = False
+            raise
+        except httpx.TimeoutException:
+            logger.warning(f"{breaker.name} request timed out")
+            breaker.record_failure()
+            return None
+        except httpx.HTTPError as e:
+            logger.warning(f"{breaker.name} request failed: {e}")
+            breaker.record_failure()
+            return None
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        
+        return response
+
+# Global instances
+http_client = HTTPClient()
+opencellid_breaker = CircuitBreaker(
+    "opencellid",
+    failure_threshold=settings.OPENCELLID_BREAKER_FAILURES,
+    reset_timeout=settings.OPENCELLID_BREAKER_RESET_SECONDS
+)
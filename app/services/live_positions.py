@@ -0,0 +1,418 @@
+"""
+Live Positions
+Current position of every vehicle in Redis: one key per vehicle plus a hash
+per route, so a fleet snapshot is a single pipelined round-trip, and a GEO
+set of live vehicles for proximity queries
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+from app.config import settings
+from app.database import mongodb, redis_client
+from app.serialization import dumps, loads
+import logging
+
+logger = logging.getLogger(__name__)
+
+UNASSIGNED = "_unassigned"  # Hash for vehicles reporting without a route
+GEO_KEY = "fleet:geo"
+SEEN_KEY = "fleet:seen"  # Last update time per vehicle, for pruning GEO_KEY
+ROUTES_KEY = "fleet:routes"
+ROUTE_PREFIX = "route:positions:"
+
+# Applies one update atomically unless the cached position is newer:
+# current-position key, route hash (moving the vehicle off its previous
+# route's hash), GEO set and last-seen score
+# KEYS: vehicle key, route key, GEO_KEY, SEEN_KEY, ROUTES_KEY, previous route key
+# ARGV: vehicle_id, payload, timestamp_ms, ttl, lon, lat, updated_at, route,
+#       ROUTE_PREFIX, UNASSIGNED
+# The previous route key is a guess (the new route, unless told otherwise);
+# every key touched must be declared, so a wrong guess changes nothing
+# Returns 1 when applied, 0 when stale, or the cached route to retry with
+UPDATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, entry = pcall(cjson.decode, current)
+    if ok and type(entry) == 'table' then
+        local previous = tonumber(entry['timestamp_ms'])
+        if previous and previous > tonumber(ARGV[3]) then
+            return 0
+        end
+        local route = entry['route_id']
+        if type(route) ~= 'string' then
+            route = ARGV[10]
+        end
+        if ARGV[9] .. route ~= KEYS[2] then
+            if ARGV[9] .. route ~= KEYS[6] then
+                return route
+            end
+            redis.call('HDEL', KEYS[6], ARGV[1])
+        end
+    end
+end
+redis.call('SETEX', KEYS[1], ARGV[4], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('SADD', KEYS[5], ARGV[8])
+redis.call('GEOADD', KEYS[3], ARGV[5], ARGV[6], ARGV[1])
+redis.call('ZADD', KEYS[4], ARGV[7], ARGV[1])
+return 1
+"""
+
+class LivePositions:
+    """Writes and reads the current-position cache"""
+    
+    def __init__(self):
+        self.ttl = settings.CURRENT_POSITION_TTL_SECONDS
+        self.PRUNE_INTERVAL = 5  # seconds
+        self.last_prune = 0.0
+        self.script = None
+        
+        self.redis_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self.applied = 0
+        self.stale = 0
+    
+    def vehicle_key(self, vehicle_id: str) -> str:
+        return f"vehicle:position:{vehicle_id}"
+    
+    def route_key(self, route_id: Optional[str]) -> str:
+        return f"{ROUTE_PREFIX}{route_id or UNASSIGNED}"
+    
+    def payload(
+        self,
+        vehicle_id: str,
+        route_id: Optional[str],
+        estimated_position: Dict,
+        accuracy: float,
+        method: str,
+        timestamp: str
+    ) -> Dict[str, Any]:
+        """Current-position entry as cached and returned"""
+        return {
+            "vehicle_id": vehicle_id,
+            "route_id": route_id,
+            "position": estimated_position,
+            "accuracy": accuracy,
+            "method": method,
+            "timestamp": timestamp,
+            "timestamp_ms": self.timestamp_ms(timestamp),
+            "updated_at": time.time()
+        }
+    
+    def timestamp_ms(self, timestamp: str) -> int:
+        """Epoch milliseconds of an ISO timestamp (naive means UTC)"""
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp() * 1000)
+    
+    def get_script(self):
+        if self.script is None:
+            self.script = redis_client.client.register_script(UPDATE_SCRIPT)
+        return self.script
+    
+    def script_args(self, payload: Dict[str, Any], previous_route: Optional[str] = None):
+        """KEYS and ARGV of UPDATE_SCRIPT for one payload"""
+        vehicle_id = payload["vehicle_id"]
+        route = payload["route_id"] or UNASSIGNED
+        lon, lat = payload["position"]["coordinates"]
+        
+        keys = [
+            self.vehicle_key(vehicle_id), self.route_key(route), GEO_KEY, SEEN_KEY, ROUTES_KEY,
+            self.route_key(previous_route or route)
+        ]
+        args = [
+            vehicle_id, dumps(payload), payload["timestamp_ms"], self.ttl,
+            lon, lat, payload["updated_at"], route, ROUTE_PREFIX, UNASSIGNED
+        ]
+        return keys, args
+    
+    async def cache(self, payload: Dict[str, Any]) -> bool:
+        """
+        Cache a vehicle's current position in one atomic round-trip
+        (two when the vehicle changed routes)
+        Returns: False when a newer position was already cached
+        """
+        applied = await self.apply(payload)
+        self.count([applied])
+        return applied
+    
+    async def cache_many(self, payloads: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Cache several vehicles' current positions in one pipelined call
+        Returns: per payload, whether it was applied (False when stale)
+        """
+        
+        if not payloads:
+            return []
+        
+        script = self.get_script()
+        pipe = redis_client.client.pipeline(transaction=False)
+        for payload in payloads:
+            keys, args = self.script_args(payload)
+            await script(keys=keys, args=args, client=pipe)
+        
+        results = []
+        for payload, result in zip(payloads, await pipe.execute()):
+            if isinstance(result, int):
+                results.append(bool(result))
+            else:
+                # Vehicle changed routes: re-run with its previous route declared
+                results.append(await self.apply(payload, previous_route=result))
+        
+        self.count(results)
+        return results
+    
+    async def apply(self, payload: Dict[str, Any], previous_route: Optional[str] = None) -> bool:
+        """Run UPDATE_SCRIPT, retrying when the previous route key was guessed wrong"""
+        
+        script = self.get_script()
+        for _ in range(3):
+            keys, args = self.script_args(payload, previous_route)
+            result = await script(keys=keys, args=args, client=redis_client.client)
+            if isinstance(result, int):
+                return bool(result)
+            previous_route = result
+        
+        logger.warning(f"Vehicle {payload['vehicle_id']} kept changing routes, update not cached")
+        return False
+    
+    def count(self, results: List[bool]):
+        applied = sum(results)
+        self.applied += applied
+        self.stale += len(results) - applied
+    
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("updated_at", 0) <= self.ttl
+    
+    async def snapshot(
+        self,
+        route_id: Optional[str] = None,
+        vehicle_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Current positions of the given vehicles, of one route, or of the whole fleet
+        Vehicles asked for by id that Redis doesn't have are read from MongoDB
+        in one aggregation; a route with no live hash, or the whole fleet while
+        Redis is down, falls back the same way
+        """
+        
+        entries: Dict[str, Dict[str, Any]] = {}
+        redis_ok = False
+        
+        if redis_client.client:
+            try:
+                entries = await self.read_redis(route_id, vehicle_ids)
+                redis_ok = True
+            except Exception as e:
+                logger.warning(f"Redis snapshot error: {e}")
+        
+        if route_id and vehicle_ids:
+            entries = {v: e for v, e in entries.items() if e.get("route_id") == route_id}
+        
+        self.redis_hits += len(entries)
+        
+        # MongoDB only for what Redis couldn't answer
+        missing = [v for v in vehicle_ids if v not in entries] if vehicle_ids else None
+        fleet_fallback = vehicle_ids is None and not entries and (route_id or not redis_ok)
+        if mongodb.db is not None and (missing or fleet_fallback):
+            for entry in await self.read_mongo(route_id, missing):
+                entries.setdefault(entry["vehicle_id"], entry)
+                self.mongo_hits += 1
+        
+        if missing:
+            self.misses += len([v for v in missing if v not in entries])
+        
+        return sorted(entries.values(), key=lambda entry: entry["vehicle_id"])
+    
+    async def read_redis(
+        self,
+        route_id: Optional[str],
+        vehicle_ids: Optional[List[str]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fresh cached entries by vehicle, in one round-trip per call"""
+        
+        client = redis_client.client
+        
+        if vehicle_ids:
+            values = await client.mget([self.vehicle_key(v) for v in vehicle_ids])
+        elif route_id:
+            values = (await client.hgetall(self.route_key(route_id))).values()
+        else:
+            routes = await client.smembers(ROUTES_KEY)
+            pipe = client.pipeline(transaction=False)
+            for route in routes:
+                pipe.hgetall(self.route_key(route))
+            values = [value for hash_ in await pipe.execute() for value in hash_.values()]
+        
+        entries = {}
+        for value in values:
+            if not value:
+                continue
+            entry = loads(value)
+            if not self.is_fresh(entry):
+                continue
+            # A vehicle that switched routes may sit in two hashes; keep the newest
+            current = entries.get(entry["vehicle_id"])
+            if current is None or entry["updated_at"] > current["updated_at"]:
+                entries[entry["vehicle_id"]] = entry
+        
+        return entries
+    
+    async def read_mongo(
+        self,
+        route_id: Optional[str],
+        vehicle_ids: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Latest stored position per vehicle in one aggregation
+        Route and fleet reads only scan the last TTL window; each case sorts
+        along its index: (vehicle_id, timestamp), (route_id, timestamp) or
+        timestamp for the whole fleet
+        """
+        
+        match: Dict[str, Any] = {"estimated_position": {"$ne": None}}
+        if vehicle_ids:
+            match["vehicle_id"] = {"$in": vehicle_ids}
+            sort = {"vehicle_id": 1, "timestamp": -1}
+        else:
+            match["timestamp"] = {"$gte": datetime.utcnow() - timedelta(seconds=self.ttl)}
+            sort = {"timestamp": -1}
+        if route_id:
+            match["route_id"] = route_id
+            if not vehicle_ids:
+                sort = {"route_id": 1, "timestamp": -1}
+        
+        pipeline = [
+            {"$match": match},
+            {"$sort": sort},
+            {"$group": {
+                "_id": "$vehicle_id",
+                "route_id": {"$first": "$route_id"},
+                "position": {"$first": "$estimated_position"},
+                "accuracy": {"$first": "$accuracy"},
+                "method": {"$first": "$method"},
+                "timestamp": {"$first": "$timestamp"}
+            }}
+        ]
+        
+        entries = []
+        try:
+            async for doc in mongodb.db.positions.aggregate(pipeline):
+                timestamp = doc["timestamp"]
+                entries.append({
+                    "vehicle_id": doc["_id"],
+                    "route_id": doc["route_id"],
+                    "position": doc["position"],
+                    "accuracy": doc["accuracy"],
+                    "method": doc["method"],
+                    "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+                    "source": "mongodb"
+                })
+        except Exception as e:
+            logger.error(f"Error reading latest positions: {e}")
+        
+        return entries
+    
+    async def prune(self):
+        """Drop vehicles that haven't reported within the TTL from the GEO set"""
+        
+        client = redis_client.client
+        stale = await client.zrangebyscore(SEEN_KEY, "-inf", time.time() - self.ttl)
+        if stale:
+            pipe = client.pipeline(transaction=False)
+            pipe.zrem(GEO_KEY, *stale)
+            pipe.zrem(SEEN_KEY, *stale)
+            await pipe.execute()
+            self.pruned += len(stale)
+        
+        self.last_prune = time.time()
+    
+    async def nearby(
+        self,
+        lat: float,
+        lon: float,
+        radius_meters: float,
+        k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Live vehicles within radius_meters of a point, nearest first
+        Returns: at most k vehicles (all in range when k is None) with distance_m
+        """
+        
+        if redis_client.client is None:
+            return []
+        
+        if time.time() - self.last_prune >= self.PRUNE_INTERVAL:
+            await self.prune()
+        
+        results = await redis_client.client.geosearch(
+            GEO_KEY,
+            longitude=lon,
+            latitude=lat,
+            radius=radius_meters,
+            unit="m",
+            sort="ASC",
+            count=k,
+            withdist=True,
+            withcoord=True
+        )
+        
+        return [
+            {
+                "vehicle_id": vehicle_id,
+                "distance_m": round(distance, 1),
+                "lat": coordinates[1],
+                "lon": coordinates[0]
+            }
+            for vehicle_id, distance, coordinates in results
+        ]
+    
+    async def active_routes(self) -> Set[str]:
+        """Routes with at least one vehicle reporting within the TTL"""
+        
+        client = redis_client.client
+        if client:
+            try:
+                routes = list(await client.smembers(ROUTES_KEY))
+                pipe = client.pipeline(transaction=False)
+                for route in routes:
+                    pipe.exists(self.route_key(route))
+                live = await pipe.execute()
+                
+                # Route hashes expire with their last vehicle; forget those routes
+                expired = [route for route, exists in zip(routes, live) if not exists]
+                if expired:
+                    await client.srem(ROUTES_KEY, *expired)
+                
+                return {route for route, exists in zip(routes, live) if exists and route != UNASSIGNED}
+            except Exception as e:
+                logger.warning(f"Redis active routes error: {e}")
+        
+        if mongodb.db is None:
+            return set()
+        
+        try:
+            since = datetime.utcnow() - timedelta(seconds=self.ttl)
+            routes = await mongodb.db.positions.distinct("route_id", {"timestamp": {"$gte": since}})
+            return {route for route in routes if route}
+        except Exception as e:
+            logger.error(f"Error reading active routes: {e}")
+            return set()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get snapshot counters"""
+        return {
+            "redis_hits": self.redis_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "pruned": self.pruned,
+            "applied": self.applied,
+            "stale": self.stale
+        }
+
+# Global instance
+live_positions = LivePositions()
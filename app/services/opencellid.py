@@ -2,22 +2,152 @@
 OpenCellID API Integration
 Fetches real cell tower locations for positioning calculations
 """
-import httpx
+import asyncio
 import logging
-from typing import Optional, Dict, Any
-from app.database import mongodb
+from typing import Optional, Dict, Any, List, Tuple
+from app.config import settings
+from app.database import mongodb, redis_client
+from app.serialization import dumps, loads
+from app.services.http_client import http_client, opencellid_breaker
+from app.services.lru_cache import LRUCache
+from app.services.single_flight import SingleFlight
+from app.services.tower_density import tower_density
+from app.services.tower_events import tower_events
+from app.services.tower_index import tower_index
+from app.services.tower_table import tower_table
+from app.services.unknown_towers import unknown_towers
 
 logger = logging.getLogger(__name__)
 
 OPENCELLID_API_KEY = "pk.6f1b2fb9578529b4d78d5b5912b99e2b"
 OPENCELLID_BASE_URL = "https://opencellid.org/cell/get"
+CELL_NOT_FOUND_CODE = 1  # OpenCellID error code for "Cell not found"
+
+# Tower document fields needed to build tower data
+TOWER_PROJECTION = {
+    "_id": 0, "mcc": 1, "mnc": 1, "lac": 1, "cid": 1, "lat": 1, "lon": 1, "location": 1,
+    "range": 1, "samples": 1, "radio": 1, "source": 1, "density_m": 1
+}
+
+def is_cell_not_found(data: Any) -> bool:
+    """
+    Whether an OpenCellID error body means the cell is unknown
+    Key, quota and request errors are transient and must not tombstone the tower
+    """
+    if not isinstance(data, dict):
+        return False
+    try:
+        if int(data.get("code", -1)) == CELL_NOT_FOUND_CODE:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return "not found" in str(data.get("error", "")).lower()
 
 class OpenCellIDService:
     """Service to query OpenCellID for tower locations"""
     
     def __init__(self):
         self.api_key = OPENCELLID_API_KEY
-        self.cache_collection = mongodb.db.towers if mongodb.db else None
+        
+        # L1: bounded in-process cache, checked before Redis (L2) and MongoDB (L3)
+        self.cache = LRUCache(
+            maxsize=settings.TOWER_CACHE_SIZE,
+            ttl=settings.TOWER_CACHE_TTL_SECONDS
+        )
+        self.redis_ttl = 86400  # 24 hours
+        
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.mongo_hits = 0
+        self.mongo_misses = 0
+        
+        # Coalesces concurrent upstream lookups of the same (mcc, mnc, lac, cid)
+        self.lookups = SingleFlight()
+        
+        self.warm_up_task: Optional[asyncio.Task] = None
+        self.warmed = 0
+        
+        # Drop towers any worker upserts so the next lookup re-reads them
+        tower_events.subscribe(self.invalidate)
+    
+    def cache_key(self, mcc: int, mnc: int, lac: int, cid: int) -> str:
+        """L1 key, also the Redis key tower_events drops on upsert"""
+        return f"tower:{mcc}:{mnc}:{lac}:{cid}"
+    
+    def invalidate(self, mcc: int, mnc: int, lac: int, cid: int):
+        self.cache.delete(self.cache_key(mcc, mnc, lac, cid))
+    
+    def start_warm_up(self):
+        """Preload the configured regions into the local cache in the background"""
+        if settings.TOWER_WARMUP_BBOXES and self.warm_up_task is None:
+            self.warm_up_task = asyncio.create_task(
+                self.warm_up(parse_bboxes(settings.TOWER_WARMUP_BBOXES))
+            )
+    
+    async def stop_warm_up(self):
+        if self.warm_up_task and not self.warm_up_task.done():
+            self.warm_up_task.cancel()
+            try:
+                await self.warm_up_task
+            except asyncio.CancelledError:
+                pass
+    
+    async def warm_up(self, bboxes: List[Tuple[float, float, float, float]]) -> int:
+        """
+        Load every tower inside the given (min_lat, min_lon, max_lat, max_lon)
+        boxes from MongoDB into the local cache, up to its capacity
+        Returns: number of towers loaded
+        """
+        
+        if mongodb.db is None or not bboxes:
+            return 0
+        
+        limit = settings.TOWER_CACHE_SIZE
+        loaded = 0
+        
+        try:
+            for min_lat, min_lon, max_lat, max_lon in bboxes:
+                cursor = mongodb.db.towers.find(
+                    {"location": {"$geoWithin": {"$geometry": {
+                        "type": "Polygon",
+                        "coordinates": [[
+                            [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat],
+                            [min_lon, max_lat], [min_lon, min_lat]
+                        ]]
+                    }}}},
+                    TOWER_PROJECTION
+                ).limit(limit - loaded)
+                
+                async for doc in cursor:
+                    if self.remember_local(doc):
+                        loaded += 1
+                
+                if loaded >= limit:
+                    break
+            
+            self.warmed += loaded
+            logger.info(f"Tower cache warmed with {loaded} towers")
+        
+        except Exception as e:
+            logger.error(f"Error warming tower cache: {e}")
+        
+        return loaded
+    
+    def remember_local(self, doc: Dict[str, Any]) -> bool:
+        """
+        Put a MongoDB tower document into L1 (warm-up and route prefetch)
+        Returns: False when the document has no usable location
+        """
+        tower = self.tower_from_doc(doc)
+        if tower is None:
+            return False
+        self.cache.set(self.cache_key(doc["mcc"], doc["mnc"], doc["lac"], doc["cid"]), tower)
+        return True
+    
+    @property
+    def cache_collection(self):
+        """Towers collection, looked up per call since MongoDB connects after import"""
+        return mongodb.db.towers if mongodb.db is not None else None
     
     async def get_tower_location(
         self, 
@@ -27,7 +157,8 @@ class OpenCellIDService:
         cid: int
     ) -> Optional[Dict[str, Any]]:
         """
-        Get tower location from OpenCellID or local cache
+        Get tower location from the local caches, MongoDB or OpenCellID
+        Priority: Offline Table -> L1 -> Redis -> MongoDB -> OpenCellID
         
         Args:
             mcc: Mobile Country Code (404 for India)
@@ -39,29 +170,96 @@ class OpenCellIDService:
             Tower data with lat, lon, range, etc. or None if not found
         """
         try:
-            # Check local cache first
+            # Check the offline tower table (no network)
+            table_tower = tower_table.lookup(mcc, mnc, lac, cid)
+            if table_tower:
+                return table_tower
+            
+            cache_key = self.cache_key(mcc, mnc, lac, cid)
+            tower = self.cache.get(cache_key)
+            if tower:
+                return tower
+            
+            # Towers tombstoned in this process skip Redis, MongoDB and OpenCellID
+            if unknown_towers.is_unknown_local(mcc, mnc, lac, cid):
+                return None
+            
+            # Redis (shared by all workers)
+            if redis_client.client:
+                try:
+                    cached = await redis_client.client.get(cache_key)
+                    if cached:
+                        self.redis_hits += 1
+                        tower = self.tower_from_cache(loads(cached))
+                        self.cache.set(cache_key, tower)
+                        return tower
+                    self.redis_misses += 1
+                except Exception as e:
+                    logger.debug(f"Redis tower cache error: {e}")
+            
+            # MongoDB
             cached_tower = await self.get_cached_tower(mcc, mnc, lac, cid)
             if cached_tower:
+                self.mongo_hits += 1
                 logger.info(f"Tower {cid} found in cache")
+                await self.remember(cache_key, cached_tower)
                 return cached_tower
+            self.mongo_misses += 1
             
-            # Query OpenCellID API
-            logger.info(f"Querying OpenCellID for tower: MCC={mcc}, MNC={mnc}, LAC={lac}, CID={cid}")
-            tower_data = await self.query_opencellid_api(mcc, mnc, lac, cid)
-            
-            if tower_data:
-                # Cache the result
-                await self.cache_tower(mcc, mnc, lac, cid, tower_data)
-                logger.info(f"Tower {cid} fetched from OpenCellID and cached")
-                return tower_data
-            else:
-                logger.warning(f"Tower {cid} not found in OpenCellID")
+            return await self.resolve_upstream(mcc, mnc, lac, cid)
+                
+        except Exception as e:
+            logger.error(f"Error getting tower location: {e}")
+            return None
+    
+    async def resolve_upstream(
+        self, 
+        mcc: int, 
+        mnc: int, 
+        lac: int, 
+        cid: int
+    ) -> Optional[Dict[str, Any]]:
+        """Resolve a tower missing from every cache tier through OpenCellID"""
+        try:
+            # Skip towers OpenCellID recently reported as unknown
+            if await unknown_towers.is_unknown(mcc, mnc, lac, cid):
+                logger.debug(f"Tower {cid} is a known unknown, skipping OpenCellID")
                 return None
+            
+            # Query OpenCellID API (one shared request per tower)
+            tower = await self.lookups.do(
+                (mcc, mnc, lac, cid),
+                lambda: self.fetch_tower(mcc, mnc, lac, cid)
+            )
+            if tower:
+                await self.remember(self.cache_key(mcc, mnc, lac, cid), tower)
+            return tower
                 
         except Exception as e:
             logger.error(f"Error getting tower location: {e}")
             return None
     
+    async def fetch_tower(
+        self, 
+        mcc: int, 
+        mnc: int, 
+        lac: int, 
+        cid: int
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch tower from OpenCellID API and cache it"""
+        logger.info(f"Querying OpenCellID for tower: MCC={mcc}, MNC={mnc}, LAC={lac}, CID={cid}")
+        tower_data = await self.query_opencellid_api(mcc, mnc, lac, cid)
+        
+        if tower_data:
+            # Cache the result
+            await unknown_towers.clear(mcc, mnc, lac, cid)
+            await self.cache_tower(mcc, mnc, lac, cid, tower_data)
+            logger.info(f"Tower {cid} fetched from OpenCellID and cached")
+            return tower_data
+        else:
+            logger.warning(f"Tower {cid} not found in OpenCellID")
+            return None
+    
     async def query_opencellid_api(
         self, 
         mcc: int, 
@@ -70,52 +268,150 @@ class OpenCellIDService:
         cid: int
     ) -> Optional[Dict[str, Any]]:
         """Query OpenCellID API for tower location"""
+        params = {
+            "key": self.api_key,
+            "mcc": mcc,
+            "mnc": mnc,
+            "lac": lac,
+            "cellid": cid,
+            "format": "json"
+        }
+        
+        # Shared connection pool; None when the circuit is open or the request failed
+        response = await http_client.get(OPENCELLID_BASE_URL, opencellid_breaker, params=params)
+        if response is None:
+            return None
+        
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                params = {
-                    "key": self.api_key,
-                    "mcc": mcc,
-                    "mnc": mnc,
-                    "lac": lac,
-                    "cellid": cid,
-                    "format": "json"
-                }
-                
-                response = await client.get(OPENCELLID_BASE_URL, params=params)
+            if response.status_code == 200:
+                data = response.json()
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Check if valid response
-                    if "lat" in data and "lon" in data:
-                        return {
-                            "lat": float(data["lat"]),
-                            "lon": float(data["lon"]),
-                            "range": int(data.get("range", 1000)),  # Coverage radius in meters
-                            "samples": int(data.get("samples", 1)),  # Number of samples
-                            "radio": data.get("radio", "GSM"),
-                            "created": data.get("created"),
-                            "updated": data.get("updated"),
-                            "source": "opencellid"
-                        }
-                    else:
-                        logger.warning(f"Invalid response from OpenCellID: {data}")
-                        return None
-                        
-                elif response.status_code == 404:
+                # Check if valid response
+                if "lat" in data and "lon" in data:
+                    return {
+                        "lat": float(data["lat"]),
+                        "lon": float(data["lon"]),
+                        "range": int(data.get("range", 1000)),  # Coverage radius in meters
+                        "samples": int(data.get("samples", 1)),  # Number of samples
+                        "radio": data.get("radio", "GSM"),
+                        "created": data.get("created"),
+                        "updated": data.get("updated"),
+                        "source": "opencellid"
+                    }
+                elif is_cell_not_found(data):
                     logger.info(f"Tower not found in OpenCellID: {cid}")
+                    await unknown_towers.mark_unknown(mcc, mnc, lac, cid)
                     return None
                 else:
-                    logger.error(f"OpenCellID API error: {response.status_code}")
+                    logger.warning(f"Invalid response from OpenCellID: {data}")
                     return None
                     
-        except httpx.TimeoutException:
-            logger.error("OpenCellID API timeout")
-            return None
+            elif response.status_code == 404:
+                logger.info(f"Tower not found in OpenCellID: {cid}")
+                await unknown_towers.mark_unknown(mcc, mnc, lac, cid)
+                return None
+            else:
+                logger.error(f"OpenCellID API error: {response.status_code}")
+                return None
+                
         except Exception as e:
             logger.error(f"Error querying OpenCellID: {e}")
             return None
     
+    async def get_towers_bulk(
+        self,
+        keys: List[Tuple[int, int, int, int]]
+    ) -> Dict[Tuple[int, int, int, int], Dict[str, Any]]:
+        """
+        Look up (mcc, mnc, lac, cid) keys in every cache tier at once: offline
+        table and L1, then one Redis MGET, then one MongoDB $or query, written
+        back to Redis with one pipelined SETEX batch
+        Returns: the towers found; the rest need resolve_upstream
+        """
+        
+        towers = {}
+        pending = {}  # cache_key -> key
+        
+        # 1. Offline table / L1 (tombstoned towers are left for resolve_upstream)
+        for key in keys:
+            cache_key = self.cache_key(*key)
+            tower = tower_table.lookup(*key) or self.cache.get(cache_key)
+            if tower:
+                towers[key] = tower
+            elif not unknown_towers.is_unknown_local(*key):
+                pending[cache_key] = key
+        
+        # 2. Redis MGET
+        if pending and redis_client.client:
+            try:
+                cache_keys = list(pending)
+                for cache_key, cached in zip(cache_keys, await redis_client.client.mget(cache_keys)):
+                    if cached:
+                        self.redis_hits += 1
+                        tower = self.tower_from_cache(loads(cached))
+                        self.cache.set(cache_key, tower)
+                        towers[pending.pop(cache_key)] = tower
+                    else:
+                        self.redis_misses += 1
+            except Exception as e:
+                logger.debug(f"Redis bulk tower cache error: {e}")
+        
+        # 3. MongoDB, one $or query over the mcc/mnc/lac/cid index
+        if pending and self.cache_collection is not None:
+            try:
+                found = {}
+                cursor = self.cache_collection.find({"$or": [
+                    {"mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid}
+                    for mcc, mnc, lac, cid in pending.values()
+                ]}, TOWER_PROJECTION)
+                async for doc in cursor:
+                    cache_key = self.cache_key(doc["mcc"], doc["mnc"], doc["lac"], doc["cid"])
+                    tower = self.tower_from_doc(doc)
+                    if cache_key in pending and tower:
+                        found[cache_key] = tower
+                
+                self.mongo_hits += len(found)
+                self.mongo_misses += len(pending) - len(found)
+                
+                for cache_key, tower in found.items():
+                    self.cache.set(cache_key, tower)
+                    towers[pending.pop(cache_key)] = tower
+                
+                # Write back to Redis in one round-trip
+                if found and redis_client.client:
+                    pipe = redis_client.client.pipeline(transaction=False)
+                    for cache_key, tower in found.items():
+                        pipe.setex(cache_key, self.redis_ttl, dumps(tower))
+                    await pipe.execute()
+            
+            except Exception as e:
+                logger.error(f"Error bulk fetching towers: {e}")
+        
+        return towers
+    
+    def tower_from_cache(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Redis entry -> tower data (TowerDatabase entries carry only lat/lon)"""
+        return {
+            "lat": data["lat"],
+            "lon": data["lon"],
+            "range": data.get("range", 1000),
+            "samples": data.get("samples", 1),
+            "radio": data.get("radio", "GSM"),
+            "source": data.get("source", "cache"),
+            "density_m": data.get("density_m")
+        }
+    
+    async def remember(self, cache_key: str, tower: Dict[str, Any]):
+        """Store resolved tower data in L1 and Redis"""
+        
+        self.cache.set(cache_key, tower)
+        
+        if redis_client.client:
+            try:
+                await redis_client.client.setex(cache_key, self.redis_ttl, dumps(tower))
+            except Exception as e:
+                logger.debug(f"Redis tower cache set error: {e}")
+    
     async def get_cached_tower(
         self, 
         mcc: int, 
@@ -125,7 +421,7 @@ class OpenCellIDService:
     ) -> Optional[Dict[str, Any]]:
         """Get tower from local MongoDB cache"""
         try:
-            if not self.cache_collection:
+            if self.cache_collection is None:
                 return None
                 
             tower = await self.cache_collection.find_one({
@@ -136,20 +432,32 @@ class OpenCellIDService:
             })
             
             if tower:
-                return {
-                    "lat": tower["lat"],
-                    "lon": tower["lon"],
-                    "range": tower.get("range", 1000),
-                    "samples": tower.get("samples", 1),
-                    "radio": tower.get("radio", "GSM"),
-                    "source": tower.get("source", "cache")
-                }
+                return self.tower_from_doc(tower)
             return None
             
         except Exception as e:
             logger.error(f"Error getting cached tower: {e}")
             return None
     
+    def tower_from_doc(self, tower: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """MongoDB tower document -> tower data, None without a location"""
+        lat, lon = tower.get("lat"), tower.get("lon")
+        if lat is None or lon is None:
+            # Towers saved by TowerDatabase only carry the GeoJSON point
+            try:
+                lon, lat = tower["location"]["coordinates"]
+            except (KeyError, TypeError, ValueError):
+                return None
+        return {
+            "lat": lat,
+            "lon": lon,
+            "range": tower.get("range", 1000),
+            "samples": tower.get("samples", 1),
+            "radio": tower.get("radio", "GSM"),
+            "source": tower.get("source", "cache"),
+            "density_m": tower.get("density_m")
+        }
+    
     async def cache_tower(
         self, 
         mcc: int, 
@@ -158,12 +466,24 @@ class OpenCellIDService:
         cid: int, 
         tower_data: Dict[str, Any]
     ):
-        """Cache tower data in MongoDB"""
+        """Cache tower data in MongoDB; its density is computed in the background"""
         try:
-            if not self.cache_collection:
+            if self.cache_collection is None:
                 logger.warning("MongoDB not connected, skipping tower cache")
                 return
                 
+            tower_doc = {
+                **tower_data,
+                "mcc": mcc,
+                "mnc": mnc,
+                "lac": lac,
+                "cid": cid,
+                "location": {
+                    "type": "Point",
+                    "coordinates": [tower_data["lon"], tower_data["lat"]]  # GeoJSON: [lon, lat]
+                }
+            }
+            
             await self.cache_collection.update_one(
                 {
                     "mcc": mcc,
@@ -171,22 +491,39 @@ class OpenCellIDService:
                     "lac": lac,
                     "cid": cid
                 },
-                {
-                    "$set": {
-                        **tower_data,
-                        "mcc": mcc,
-                        "mnc": mnc,
-                        "lac": lac,
-                        "cid": cid
-                    }
-                },
+                {"$set": tower_doc},
                 upsert=True
             )
             logger.info(f"Tower {cid} cached successfully")
             
+            tower_index.upsert(tower_doc)
+            await tower_events.publish(mcc, mnc, lac, cid)
+            tower_density.schedule(mcc, mnc, lac, cid, tower_data["lat"], tower_data["lon"])
+            
         except Exception as e:
             logger.error(f"Error caching tower: {e}")
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Get lookup counters"""
+        redis_lookups = self.redis_hits + self.redis_misses
+        mongo_lookups = self.mongo_hits + self.mongo_misses
+        return {
+            "local_cache": self.cache.get_stats(),
+            "warmed": self.warmed,
+            "redis": {
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "hit_ratio": round(self.redis_hits / redis_lookups, 4) if redis_lookups else 0.0
+            },
+            "mongodb": {
+                "hits": self.mongo_hits,
+                "misses": self.mongo_misses,
+                "hit_ratio": round(self.mongo_hits / mongo_lookups, 4) if mongo_lookups else 0.0
+            },
+            "lookups": self.lookups.get_stats(),
+            "breaker": opencellid_breaker.get_stats()
+        }
+    
     async def get_mock_tower_fallback(self, cid: int) -> Optional[Dict[str, Any]]:
         """
         Fallback to mock tower data if OpenCellID fails
@@ -210,5 +547,17 @@ class OpenCellIDService:
         
         return None
 
+def parse_bboxes(value: str) -> List[Tuple[float, float, float, float]]:
+    """Parse "min_lat,min_lon,max_lat,max_lon;..." into bounding boxes"""
+    bboxes = []
+    for part in value.split(";"):
+        try:
+            min_lat, min_lon, max_lat, max_lon = (float(x) for x in part.split(","))
+            bboxes.append((min_lat, min_lon, max_lat, max_lon))
+        except ValueError:
+            if part.strip():
+                logger.warning(f"Ignoring invalid warm-up bounding box: {part}")
+    return bboxes
+
 # Global instance
 opencellid_service = OpenCellIDService()
@@ -0,0 +1,204 @@
+"""
+Position History
+Time-bounded, keyset-paginated reads of a vehicle's stored positions and
+streaming NDJSON/CSV export straight from the MongoDB cursor
+"""
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from app.database import mongodb
+from app.serialization import dumps_str
+from app.services.cell_codec import decode_position
+
+# Fields a client may project; raw_data is only returned when asked for
+FIELDS = [
+    "vehicle_id", "route_id", "timestamp", "estimated_position", "accuracy",
+    "method", "device_type", "created_at", "raw_data"
+]
+DEFAULT_FIELDS = [field for field in FIELDS if field != "raw_data"]
+
+class PositionHistory:
+    """Builds history queries and serializes their results"""
+    
+    def __init__(self):
+        self.STREAM_BATCH_SIZE = 1000
+    
+    def parse_fields(self, fields: Optional[str]) -> List[str]:
+        """Comma-separated field list -> validated projection fields"""
+        if not fields:
+            return DEFAULT_FIELDS
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(selected) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return selected
+    
+    def encode_cursor(self, position: Dict[str, Any]) -> str:
+        """Keyset token of a position: <timestamp ISO>_<_id>"""
+        return f"{position['timestamp'].isoformat()}_{position['_id']}"
+    
+    def decode_cursor(self, token: str) -> Tuple[datetime, ObjectId]:
+        try:
+            timestamp, position_id = token.rsplit("_", 1)
+            return datetime.fromisoformat(timestamp), ObjectId(position_id)
+        except (ValueError, InvalidId):
+            raise ValueError(f"Invalid cursor: {token}")
+    
+    def build_query(
+        self,
+        vehicle_id: str,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        after: Optional[str]
+    ) -> Dict[str, Any]:
+        """Filter for positions in [start, end) after the keyset cursor, if any"""
+        
+        query: Dict[str, Any] = {"vehicle_id": vehicle_id}
+        
+        bounds = {}
+        if start:
+            bounds["$gte"] = start
+        if end:
+            bounds["$lt"] = end
+        if bounds:
+            query["timestamp"] = bounds
+        
+        if after:
+            timestamp, position_id = self.decode_cursor(after)
+            query["$or"] = [
+                {"timestamp": {"$gt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$gt": position_id}}
+            ]
+        
+        return query
+    
+    def find(
+        self,
+        vehicle_id: str,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        after: Optional[str],
+        fields: List[str]
+    ):
+        """Motor cursor over the matching positions, oldest first"""
+        projection = {field: 1 for field in fields}
+        projection["timestamp"] = 1  # Needed for the keyset cursor
+        return mongodb.db.positions.find(
+            self.build_query(vehicle_id, start, end, after),
+            projection
+        ).sort([("timestamp", 1), ("_id", 1)])
+    
+    async def page(
+        self,
+        vehicle_id: str,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        after: Optional[str],
+        fields: List[str],
+        limit: int
+    ) -> Dict[str, Any]:
+        """
+        One page of history
+        Returns: positions plus the cursor of the next page (None on the last page)
+        """
+        
+        cursor = self.find(vehicle_id, start, end, after, fields).limit(limit + 1)
+        positions = await cursor.to_list(length=limit + 1)
+        
+        next_cursor = None
+        if len(positions) > limit:
+            positions = positions[:limit]
+            next_cursor = self.encode_cursor(positions[-1])
+        
+        return {
+            "vehicle_id": vehicle_id,
+            "count": len(positions),
+            "positions": [self.serialize(position, fields) for position in positions],
+            "next": next_cursor
+        }
+    
+    def serialize(self, position: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+        """JSON-ready position with only the projected fields"""
+        decode_position(position)
+        result = {"_id": str(position["_id"])}
+        for field in fields:
+            value = position.get(field)
+            result[field] = value.isoformat() if isinstance(value, datetime) else value
+        return result
+    
+    async def stream(
+        self,
+        vehicle_id: str,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        after: Optional[str],
+        fields: List[str],
+        fmt: str,
+        compress: bool
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield the export as NDJSON or CSV chunks (optionally gzipped), one
+        cursor batch at a time so memory stays flat however long the track
+        """
+        
+        cursor = self.find(vehicle_id, start, end, after, fields).batch_size(self.STREAM_BATCH_SIZE)
+        gzip = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+        columns = self.csv_columns(fields)
+        
+        def emit(text: str) -> bytes:
+            data = text.encode()
+            return gzip.compress(data) if gzip else data
+        
+        if fmt == "csv":
+            yield emit(self.csv_line(columns))
+        
+        buffer = []
+        async for position in cursor:
+            position = self.serialize(position, fields)
+            if fmt == "csv":
+                buffer.append(self.csv_line([self.csv_value(position, column) for column in columns]))
+            else:
+                buffer.append(dumps_str(position) + "\n")
+            
+            if len(buffer) >= self.STREAM_BATCH_SIZE:
+                chunk = emit("".join(buffer))
+                buffer = []
+                if chunk:
+                    yield chunk
+        
+        tail = emit("".join(buffer))
+        if gzip:
+            tail += gzip.flush()
+        if tail:
+            yield tail
+    
+    def csv_columns(self, fields: List[str]) -> List[str]:
+        """CSV header; estimated_position is split into lat/lon columns"""
+        columns = ["_id"]
+        for field in fields:
+            columns.extend(["lat", "lon"] if field == "estimated_position" else [field])
+        return columns
+    
+    def csv_value(self, position: Dict[str, Any], column: str) -> Any:
+        point = position.get("estimated_position")
+        if column == "lat":
+            return point["coordinates"][1] if point else ""
+        if column == "lon":
+            return point["coordinates"][0] if point else ""
+        
+        value = position.get(column)
+        if isinstance(value, (dict, list)):
+            return dumps_str(value)
+        return "" if value is None else value
+    
+    def csv_line(self, values: List[Any]) -> str:
+        line = io.StringIO()
+        csv.writer(line).writerow(values)
+        return line.getvalue()
+
+# Global instance
+position_history = PositionHistory()
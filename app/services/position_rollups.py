@@ -0,0 +1,146 @@
+"""
+Position Rollups
+Per-vehicle, per-minute summaries of stored positions for long-range
+history queries without scanning raw position documents
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from pymongo import UpdateOne
+from app.database import mongodb
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PositionRollups:
+    """Maintains and queries the position_rollups collection"""
+    
+    def __init__(self):
+        self.updated = 0
+    
+    def to_utc(self, timestamp: datetime) -> datetime:
+        """Naive UTC datetime, as MongoDB stores and returns it"""
+        if timestamp.tzinfo:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp
+    
+    def minute_of(self, timestamp: datetime) -> datetime:
+        return self.to_utc(timestamp).replace(second=0, microsecond=0)
+    
+    async def record(self, docs: List[Dict[str, Any]]):
+        """Fold position documents into their minute rollups with one bulk write"""
+        
+        rollups: Dict[tuple, Dict[str, Any]] = {}
+        for doc in docs:
+            timestamp = self.to_utc(doc["timestamp"])
+            key = (doc["vehicle_id"], self.minute_of(timestamp))
+            rollup = rollups.setdefault(key, {
+                "route_id": doc.get("route_id"),
+                "count": 0, "located": 0,
+                "sum_lat": 0.0, "sum_lon": 0.0, "sum_accuracy": 0.0,
+                "first": timestamp, "last": timestamp,
+                "accuracies": []
+            })
+            
+            rollup["count"] += 1
+            rollup["first"] = min(rollup["first"], timestamp)
+            rollup["last"] = max(rollup["last"], timestamp)
+            
+            if doc.get("estimated_position"):
+                lon, lat = doc["estimated_position"]["coordinates"]
+                accuracy = doc.get("accuracy") or 0
+                rollup["located"] += 1
+                rollup["sum_lat"] += lat
+                rollup["sum_lon"] += lon
+                rollup["sum_accuracy"] += accuracy
+                rollup["accuracies"].append(accuracy)
+        
+        if not rollups:
+            return
+        
+        operations = []
+        for (vehicle_id, minute), rollup in rollups.items():
+            update = {
+                "$inc": {
+                    "count": rollup["count"],
+                    "located": rollup["located"],
+                    "sum_lat": rollup["sum_lat"],
+                    "sum_lon": rollup["sum_lon"],
+                    "sum_accuracy": rollup["sum_accuracy"]
+                },
+                "$min": {"first_timestamp": rollup["first"]},
+                "$max": {"last_timestamp": rollup["last"]},
+                "$set": {"route_id": rollup["route_id"]}
+            }
+            if rollup["accuracies"]:
+                update["$min"]["min_accuracy"] = min(rollup["accuracies"])
+                update["$max"]["max_accuracy"] = max(rollup["accuracies"])
+            
+            operations.append(UpdateOne(
+                {"vehicle_id": vehicle_id, "minute": minute}, update, upsert=True
+            ))
+        
+        try:
+            await mongodb.db.position_rollups.bulk_write(operations, ordered=False)
+            self.updated += len(operations)
+        except Exception as e:
+            logger.error(f"Error updating position rollups: {e}")
+    
+    async def query(
+        self,
+        vehicle_id: str,
+        start: datetime,
+        end: datetime,
+        interval_minutes: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        Rollups for a vehicle between start and end, merged into
+        interval_minutes buckets
+        Returns: one summary per bucket, oldest first
+        """
+        
+        pipeline = [
+            {"$match": {
+                "vehicle_id": vehicle_id,
+                "minute": {"$gte": self.minute_of(start), "$lte": self.minute_of(end)}
+            }},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$minute", "unit": "minute", "binSize": interval_minutes}},
+                "count": {"$sum": "$count"},
+                "located": {"$sum": "$located"},
+                "sum_lat": {"$sum": "$sum_lat"},
+                "sum_lon": {"$sum": "$sum_lon"},
+                "sum_accuracy": {"$sum": "$sum_accuracy"},
+                "min_accuracy": {"$min": "$min_accuracy"},
+                "max_accuracy": {"$max": "$max_accuracy"},
+                "first_timestamp": {"$min": "$first_timestamp"},
+                "last_timestamp": {"$max": "$last_timestamp"}
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+        
+        buckets = []
+        async for bucket in mongodb.db.position_rollups.aggregate(pipeline):
+            located = bucket["located"]
+            buckets.append({
+                "start": bucket["_id"].isoformat(),
+                "count": bucket["count"],
+                "located": located,
+                "position": {
+                    "lat": bucket["sum_lat"] / located,
+                    "lon": bucket["sum_lon"] / located
+                } if located else None,
+                "avg_accuracy": round(bucket["sum_accuracy"] / located, 1) if located else None,
+                "min_accuracy": bucket["min_accuracy"],
+                "max_accuracy": bucket["max_accuracy"],
+                "first_timestamp": bucket["first_timestamp"].isoformat(),
+                "last_timestamp": bucket["last_timestamp"].isoformat()
+            })
+        
+        return buckets
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get rollup counters"""
+        return {"updated": self.updated}
+
+# Global instance
+position_rollups = PositionRollups()
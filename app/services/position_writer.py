@@ -0,0 +1,214 @@
+"""
+Position Writer
+Optional write-behind persistence: position documents are queued in-process
+and flushed to MongoDB with insert_many by batch size or time window
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.database import mongodb
+from app.services.position_rollups import position_rollups
+import logging
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+class PositionWriter:
+    """Writes position documents directly, or through a bounded write-behind queue"""
+    
+    def __init__(self):
+        self.enabled = settings.POSITION_WRITE_BEHIND
+        self.batch_size = settings.POSITION_WRITE_BATCH_SIZE
+        self.flush_interval = settings.POSITION_WRITE_FLUSH_SECONDS
+        self.max_retries = settings.POSITION_WRITE_MAX_RETRIES
+        
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        
+        # Rollups for direct writes, recorded off the request path
+        self.rollup_tasks: Set[asyncio.Task] = set()
+        
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+    
+    def start(self):
+        """Start the flush task when write-behind is enabled"""
+        if self.enabled and self.task is None:
+            self.queue = asyncio.Queue(maxsize=settings.POSITION_WRITE_QUEUE_SIZE)
+            self.task = asyncio.create_task(self.run())
+            self.running = True
+            logger.info("✅ Position write-behind enabled")
+    
+    async def stop(self):
+        """Stop accepting documents and flush everything still queued"""
+        
+        if self.rollup_tasks:
+            await asyncio.gather(*self.rollup_tasks, return_exceptions=True)
+        
+        if self.task is None:
+            return
+        
+        self.running = False
+        
+        # A dead writer would never make room for the sentinel
+        if self.task.done():
+            if not self.task.cancelled() and self.task.exception():
+                logger.error(f"Position writer had failed: {self.task.exception()}")
+            if self.queue.qsize():
+                logger.error(f"Position writer not running, {self.queue.qsize()} documents lost")
+            self.task = None
+            return
+        
+        async def drain():
+            await self.queue.put(None)  # Sentinel: flush and exit
+            await self.task
+        
+        try:
+            await asyncio.wait_for(drain(), timeout=settings.POSITION_WRITE_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error(f"Position writer drain timed out, {self.queue.qsize()} documents lost")
+        self.task = None
+    
+    async def write(self, doc: Dict[str, Any]) -> ObjectId:
+        """
+        Persist one position document
+        Returns: the document id (assigned up front when queued)
+        """
+        return (await self.write_many([doc]))[0]
+    
+    async def write_many(self, docs: List[Dict[str, Any]]) -> List[ObjectId]:
+        """
+        Persist position documents, queued when write-behind is running
+        Blocks while the queue is full, which pushes back on ingest
+        Returns: the document ids, in order
+        """
+        
+        if not docs:
+            return []
+        
+        if not self.running:
+            if len(docs) == 1:
+                result = await mongodb.db.positions.insert_one(docs[0])
+                ids = [result.inserted_id]
+            else:
+                result = await mongodb.db.positions.insert_many(docs, ordered=False)
+                ids = list(result.inserted_ids)
+            
+            if settings.POSITION_ROLLUPS:
+                task = asyncio.create_task(position_rollups.record(docs))
+                self.rollup_tasks.add(task)
+                task.add_done_callback(self.rollup_tasks.discard)
+            return ids
+        
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            await self.queue.put(doc)
+        
+        return [doc["_id"] for doc in docs]
+    
+    async def run(self):
+        """Collect documents into batches and flush them"""
+        
+        while True:
+            doc = await self.queue.get()
+            if doc is None:
+                return
+            
+            batch = [doc]
+            deadline = time.monotonic() + self.flush_interval
+            closing = False
+            
+            # Fill the batch until it's full or the window closes
+            while len(batch) < self.batch_size:
+                try:
+                    doc = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        doc = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                
+                if doc is None:
+                    closing = True
+                    break
+                batch.append(doc)
+            
+            await self.flush(batch)
+            
+            if closing:
+                return
+    
+    async def flush(self, batch: List[Dict[str, Any]]):
+        """
+        insert_many with exponential back-off; ids make retries idempotent
+        (time-series collections don't enforce unique ids, so a retry after a
+        partly applied attempt can store duplicates there)
+        """
+        
+        started = time.monotonic()
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                await mongodb.db.positions.insert_many(batch, ordered=False)
+                break
+            
+            except BulkWriteError as e:
+                # Documents from an earlier, partly applied attempt are already stored
+                errors = e.details.get("writeErrors", [])
+                if errors and all(error.get("code") == DUPLICATE_KEY for error in errors):
+                    break
+                error = e
+            
+            except Exception as e:
+                error = e
+            
+            if attempt == self.max_retries:
+                self.dropped += len(batch)
+                logger.error(f"Dropping {len(batch)} positions after {attempt + 1} attempts: {error}")
+                return
+            
+            self.retries += 1
+            delay = min(0.5 * 2 ** attempt, 30)
+            logger.warning(f"Position flush failed ({error}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+        
+        if settings.POSITION_ROLLUPS:
+            await position_rollups.record(batch)
+        
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.written += len(batch)
+        self.batches += 1
+        self.last_flush_ms = round(elapsed_ms, 2)
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        self.total_flush_ms += elapsed_ms
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue and flush metrics"""
+        return {
+            "enabled": self.running,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "pending_rollups": len(self.rollup_tasks),
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": round(self.total_flush_ms / self.batches, 2) if self.batches else 0.0
+        }
+
+# Global instance
+position_writer = PositionWriter()
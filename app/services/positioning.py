@@ -1,8 +1,13 @@
+import asyncio
 import math
 import numpy as np
 from typing import List, Tuple, Optional, Dict
+from app.config import settings
 from app.models.schemas import CellTowerData, Position
+from app.services.lru_cache import LRUCache
+from app.services.compute_pool import compute_pool
 from app.services.opencellid import opencellid_service
+from app.services.trilateration import trilateration_solver
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,6 +26,15 @@ class PositioningEngine:
         self.PATH_LOSS_EXPONENT = 0.22  # Urban environment
         self.REFERENCE_DISTANCE = 100  # meters
         
+        # Memo of recent estimates keyed by quantized scan fingerprint
+        self.position_memo = LRUCache(
+            maxsize=settings.POSITION_MEMO_SIZE,
+            ttl=settings.POSITION_MEMO_TTL_SECONDS
+        )
+        
+        # Neighbourhood density (meters) of resolved towers, keyed by (mcc, mnc, lac, cid)
+        self.tower_density = LRUCache(maxsize=settings.TOWER_DENSITY_CACHE_SIZE)
+        
     async def estimate_position(
         self,
         cells: List[CellTowerData],
@@ -36,9 +50,51 @@ class PositioningEngine:
             return None, 0, "no_data"
         
         # If tower_locations not provided, fetch from OpenCellID
+        # (repeat scans are answered from the memo without any lookups)
+        fingerprint = None
         if tower_locations is None:
+            fingerprint = self.scan_fingerprint(cells)
+            memoized = self.position_memo.get(fingerprint)
+            if memoized:
+                return memoized
+            
             tower_locations = await self.fetch_tower_locations(cells)
         
+        result = await self.estimate_from_towers(cells, tower_locations)
+        
+        if fingerprint is not None and result[0]:
+            self.position_memo.set(fingerprint, result)
+        
+        return result
+    
+    async def estimate_from_towers(
+        self,
+        cells: List[CellTowerData],
+        tower_locations: Dict[int, Tuple[float, float]]
+    ) -> Tuple[Position, float, str]:
+        """
+        Run the positioning tiers for a scan with resolved tower locations
+        The numeric tiers run on the compute pool, off the event loop
+        Returns: (position, accuracy_meters, method_used)
+        """
+        
+        high_density = self.is_high_density(
+            tower_locations, self.located_keys(cells, tower_locations)
+        )
+        
+        return await compute_pool.run(solve_position, cells, tower_locations, high_density)
+    
+    def solve_position(
+        self,
+        cells: List[CellTowerData],
+        tower_locations: Dict[int, Tuple[float, float]],
+        high_density: bool
+    ) -> Tuple[Position, float, str]:
+        """
+        Hierarchical positioning tiers (CPU-bound, no I/O)
+        Returns: (position, accuracy_meters, method_used)
+        """
+        
         # Filter cells that have known tower locations
         valid_cells = [
             cell for cell in cells 
@@ -52,20 +108,20 @@ class PositioningEngine:
         
         # Tier 1: Triangulation with Timing Advance
         if len(valid_cells) >= 3 and any(cell.ta is not None for cell in valid_cells):
-            position, accuracy = await self.triangulation_with_ta(valid_cells, tower_locations)
+            position, accuracy = self.triangulation_with_ta(valid_cells, tower_locations)
             if position:
                 return position, accuracy, "triangulation_ta"
         
         # Tier 2: Weighted Centroid with RSSI
         if len(valid_cells) >= 2:
-            if len(valid_cells) >= 3 and self.is_high_density(tower_locations):
+            if len(valid_cells) >= 3 and high_density:
                 # Use Crude Estimation Method for dense areas
-                position, accuracy = await self.crude_estimation_method(valid_cells, tower_locations)
+                position, accuracy = self.crude_estimation_method(valid_cells, tower_locations)
                 if position:
                     return position, accuracy, "crude_estimation"
             
             # Use weighted centroid
-            position, accuracy = await self.weighted_centroid(valid_cells, tower_locations)
+            position, accuracy = self.weighted_centroid(valid_cells, tower_locations)
             if position:
                 return position, accuracy, "weighted_centroid"
         
@@ -76,43 +132,297 @@ class PositioningEngine:
         accuracy = 800  # Rough estimate for cell range
         return position, accuracy, "cell_id_fallback"
     
+    async def estimate_positions_batch(
+        self,
+        scans: List[List[CellTowerData]],
+        tower_locations: List[Dict[int, Tuple[float, float]]] = None
+    ) -> List[Tuple[Optional[Position], float, str]]:
+        """
+        Estimate positions for many cell scans at once
+        Weighted centroid, CEM and density checks run as one vectorized
+        pass over all scans; TA triangulation is still solved per scan
+        Returns: list of (position, accuracy_meters, method_used) per scan
+        """
+        
+        results = [(None, 0, "no_data")] * len(scans)
+        fingerprints = {}
+        pending = list(range(len(scans)))
+        
+        # If tower_locations not provided, fetch from OpenCellID
+        # (repeat scans are answered from the memo without any lookups)
+        if tower_locations is None:
+            pending = []
+            for i, cells in enumerate(scans):
+                if cells:
+                    fingerprints[i] = self.scan_fingerprint(cells)
+                    memoized = self.position_memo.get(fingerprints[i])
+                    if memoized:
+                        results[i] = memoized
+                        continue
+                    
+                pending.append(i)
+            
+            # Each distinct tower is resolved once for the whole batch
+            unique_cells = {}
+            for i in pending:
+                for cell in scans[i]:
+                    unique_cells.setdefault(self.tower_key(cell), cell)
+            resolved = await self.resolve_towers(list(unique_cells.values()))
+            
+            tower_locations = [
+                {
+                    cell.cid: resolved[self.tower_key(cell)]
+                    for cell in cells if self.tower_key(cell) in resolved
+                }
+                for cells in scans
+            ]
+        
+        if pending:
+            densities = [
+                self.lookup_density(self.located_keys(scans[i], tower_locations[i]))
+                for i in pending
+            ]
+            
+            solved = await compute_pool.run(
+                solve_positions_batch,
+                [scans[i] for i in pending],
+                [tower_locations[i] for i in pending],
+                densities
+            )
+            
+            for i, result in zip(pending, solved):
+                results[i] = result
+        
+        for i, fingerprint in fingerprints.items():
+            if results[i][0]:
+                self.position_memo.set(fingerprint, results[i])
+        
+        return results
+    
+    def solve_positions_batch(
+        self,
+        scans: List[List[CellTowerData]],
+        tower_locations: List[Dict[int, Tuple[float, float]]],
+        densities: List[Optional[float]]
+    ) -> List[Tuple[Optional[Position], float, str]]:
+        """
+        Vectorized positioning tiers for many scans (CPU-bound, no I/O)
+        densities holds the stored tower density per scan, or None to fall
+        back to the pairwise check
+        Returns: list of (position, accuracy_meters, method_used) per scan
+        """
+        
+        results = [(None, 0, "no_data")] * len(scans)
+        valid_scans = {}
+        
+        for i, cells in enumerate(scans):
+            if not cells:
+                continue
+            
+            locations = tower_locations[i]
+            valid_cells = [cell for cell in cells if cell.cid in locations]
+            
+            if not valid_cells:
+                results[i] = (None, 0, "no_tower_data")
+                continue
+            
+            # Tier 1: Triangulation with Timing Advance
+            if len(valid_cells) >= 3 and any(cell.ta is not None for cell in valid_cells):
+                position, accuracy = self.triangulation_with_ta(valid_cells, locations)
+                if position:
+                    results[i] = (position, accuracy, "triangulation_ta")
+                    continue
+            
+            valid_scans[i] = valid_cells
+        
+        # Tier 2: Weighted Centroid / CEM, vectorized over all remaining scans
+        multi = [i for i, cells in valid_scans.items() if len(cells) >= 2]
+        
+        if multi:
+            cells_array, cells_mask = self._pad_rows([
+                [
+                    (*tower_locations[i][cell.cid], cell.rssi)
+                    for cell in valid_scans[i]
+                ]
+                for i in multi
+            ], 3)
+            towers_array, towers_mask = self._pad_rows([
+                list(tower_locations[i].values()) for i in multi
+            ], 2)
+            
+            lat, lon, rssi = cells_array[..., 0], cells_array[..., 1], cells_array[..., 2]
+            
+            dense = self._batch_high_density(towers_array, towers_mask)
+            for k, i in enumerate(multi):
+                if densities[i] is not None and len(tower_locations[i]) >= 2:
+                    dense[k] = densities[i] < 800  # meters
+            dense &= cells_mask.sum(axis=1) >= 3
+            
+            cem = np.flatnonzero(dense)
+            cem_positions, cem_ok = self._batch_crude_estimation(
+                lat[cem], lon[cem], rssi[cem], cells_mask[cem]
+            )
+            cem_results = {
+                int(k): (cem_positions[n], cem_ok[n]) for n, k in enumerate(cem)
+            }
+            
+            wc_positions, wc_ok = self._batch_weighted_centroid(lat, lon, rssi, cells_mask)
+            
+            for k, i in enumerate(multi):
+                if k in cem_results and cem_results[k][1]:
+                    final = cem_results[k][0]
+                    results[i] = (Position(lat=final[0], lon=final[1]), 250, "crude_estimation")
+                elif wc_ok[k]:
+                    final = wc_positions[k]
+                    results[i] = (Position(lat=final[0], lon=final[1]), 400, "weighted_centroid")
+                else:
+                    continue
+                del valid_scans[i]
+        
+        # Tier 3: Cell-ID Fallback
+        for i, valid_cells in valid_scans.items():
+            tower_loc = tower_locations[i][valid_cells[0].cid]
+            results[i] = (Position(lat=tower_loc[0], lon=tower_loc[1]), 800, "cell_id_fallback")
+        
+        return results
+    
+    def scan_fingerprint(self, cells: List[CellTowerData]) -> Tuple:
+        """
+        Canonical key for a cell scan: the serving cell plus the sorted set of
+        (mcc, mnc, lac, cid, ta, rssi bucket), so small RSSI jitter maps to
+        the same key
+        """
+        
+        bucket = max(settings.POSITION_MEMO_RSSI_BUCKET_DB, 1)
+        
+        def cell_key(cell: CellTowerData) -> Tuple:
+            ta = cell.ta if cell.ta is not None else -1
+            return (cell.mcc, cell.mnc, cell.lac, cell.cid, ta, cell.rssi // bucket)
+        
+        return cell_key(cells[0]), tuple(sorted(cell_key(cell) for cell in cells))
+    
     async def fetch_tower_locations(self, cells: List[CellTowerData]) -> Dict[int, Tuple[float, float]]:
         """
-        Fetch tower locations from OpenCellID for all cells
-        Falls back to mock data if OpenCellID fails
+        Fetch tower locations from OpenCellID for all cells concurrently
+        Cells not resolved within the per-scan deadline are skipped
+        """
+        resolved = await self.resolve_towers(cells)
+        return {
+            cell.cid: resolved[self.tower_key(cell)]
+            for cell in cells if self.tower_key(cell) in resolved
+        }
+    
+    def tower_key(self, cell: CellTowerData) -> Tuple[int, int, int, int]:
+        return (cell.mcc, cell.mnc, cell.lac, cell.cid)
+    
+    async def resolve_towers(
+        self,
+        cells: List[CellTowerData]
+    ) -> Dict[Tuple[int, int, int, int], Tuple[float, float]]:
+        """
+        Resolve cells under the lookup deadline: every cached tier in one
+        batch (Redis MGET + one MongoDB query), then the rest concurrently
+        through OpenCellID
+        Returns: (mcc, mnc, lac, cid) -> (lat, lon) for the cells resolved in time
         """
         tower_locations = {}
         
+        if not cells:
+            return tower_locations
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.TOWER_LOOKUP_DEADLINE_SECONDS
+        
+        try:
+            cached = await asyncio.wait_for(
+                opencellid_service.get_towers_bulk([self.tower_key(cell) for cell in cells]),
+                settings.TOWER_LOOKUP_DEADLINE_SECONDS
+            )
+        except asyncio.TimeoutError:
+            cached = {}
+        
+        remaining = []
         for cell in cells:
-            try:
-                # Get MCC and MNC from cell data
-                mcc = cell.mcc if hasattr(cell, 'mcc') else 404  # Default to India
-                mnc = cell.mnc if hasattr(cell, 'mnc') else 45   # Default to Airtel
-                lac = cell.lac
-                cid = cell.cid
-                
-                # Query OpenCellID
-                tower_data = await opencellid_service.get_tower_location(mcc, mnc, lac, cid)
-                
-                if tower_data:
-                    tower_locations[cid] = (tower_data['lat'], tower_data['lon'])
-                    logger.info(f"Tower {cid} location: ({tower_data['lat']}, {tower_data['lon']})")
-                else:
-                    # Fallback to mock tower if available
-                    mock_tower = await opencellid_service.get_mock_tower_fallback(cid)
-                    if mock_tower:
-                        tower_locations[cid] = (mock_tower['lat'], mock_tower['lon'])
-                        logger.info(f"Using mock location for tower {cid}")
-                    else:
-                        logger.warning(f"No location found for tower {cid}")
-                        
-            except Exception as e:
-                logger.error(f"Error fetching tower {cell.cid}: {e}")
-                continue
+            tower_data = cached.get(self.tower_key(cell))
+            if tower_data:
+                tower_locations[self.tower_key(cell)] = self.use_tower(self.tower_key(cell), tower_data)
+            else:
+                remaining.append(cell)
+        
+        if not remaining:
+            return tower_locations
+        
+        limit = asyncio.Semaphore(max(settings.TOWER_LOOKUP_CONCURRENCY, 1))
+        
+        async def resolve(cell: CellTowerData) -> Optional[Tuple[float, float]]:
+            async with limit:
+                return await self.fetch_tower_location(cell, upstream_only=True)
+        
+        cells = remaining
+        tasks = [asyncio.create_task(resolve(cell)) for cell in cells]
+        done, pending = await asyncio.wait(tasks, timeout=max(deadline - loop.time(), 0))
+        
+        if pending:
+            for task in pending:
+                task.cancel()
+            logger.warning(
+                f"{len(pending)} tower lookups missed the "
+                f"{settings.TOWER_LOOKUP_DEADLINE_SECONDS}s deadline, skipping"
+            )
+        
+        for cell, task in zip(cells, tasks):
+            if task in done and task.result():
+                tower_locations[self.tower_key(cell)] = task.result()
         
         return tower_locations
     
-    async def triangulation_with_ta(
+    def use_tower(self, key: Tuple[int, int, int, int], tower_data: Dict) -> Tuple[float, float]:
+        """Remember a resolved tower's density; Returns: its (lat, lon)"""
+        if tower_data.get('density_m') is not None:
+            self.tower_density.set(key, tower_data['density_m'])
+        return (tower_data['lat'], tower_data['lon'])
+    
+    async def fetch_tower_location(
+        self,
+        cell: CellTowerData,
+        upstream_only: bool = False
+    ) -> Optional[Tuple[float, float]]:
+        """
+        Fetch one tower location from OpenCellID
+        upstream_only skips the cache tiers (already checked in bulk)
+        Falls back to mock data if OpenCellID fails
+        """
+        try:
+            # Get MCC and MNC from cell data
+            mcc = cell.mcc if hasattr(cell, 'mcc') else 404  # Default to India
+            mnc = cell.mnc if hasattr(cell, 'mnc') else 45   # Default to Airtel
+            lac = cell.lac
+            cid = cell.cid
+            
+            # Query OpenCellID
+            if upstream_only:
+                tower_data = await opencellid_service.resolve_upstream(mcc, mnc, lac, cid)
+            else:
+                tower_data = await opencellid_service.get_tower_location(mcc, mnc, lac, cid)
+            
+            if tower_data:
+                logger.info(f"Tower {cid} location: ({tower_data['lat']}, {tower_data['lon']})")
+                return self.use_tower((mcc, mnc, lac, cid), tower_data)
+            
+            # Fallback to mock tower if available
+            mock_tower = await opencellid_service.get_mock_tower_fallback(cid)
+            if mock_tower:
+                logger.info(f"Using mock location for tower {cid}")
+                return (mock_tower['lat'], mock_tower['lon'])
+            
+            logger.warning(f"No location found for tower {cid}")
+            
+        except Exception as e:
+            logger.error(f"Error fetching tower {cell.cid}: {e}")
+        
+        return None
+    
+    def triangulation_with_ta(
         self,
         cells: List[CellTowerData],
         tower_locations: Dict[int, Tuple[float, float]]
@@ -159,36 +469,12 @@ class PositioningEngine:
         distances: List[float]
     ) -> Optional[List[float]]:
         """
-        Solve trilateration using least squares optimization
+        Solve trilateration in a local planar projection
+        (linear initial fix + Gauss-Newton, LM fallback)
         """
-        try:
-            # Convert to numpy arrays
-            towers = np.array(tower_coords)
-            dists = np.array(distances)
-            
-            # Initial guess (centroid of towers)
-            x0 = np.mean(towers, axis=0)
-            
-            # Least squares optimization
-            from scipy.optimize import least_squares
-            
-            def residuals(pos):
-                return np.array([
-                    self.haversine_distance(pos[0], pos[1], tower[0], tower[1]) - dist
-                    for tower, dist in zip(towers, dists)
-                ])
-            
-            result = least_squares(residuals, x0, method='lm')
-            
-            if result.success:
-                return result.x.tolist()
-            
-        except Exception as e:
-            logger.error(f"Trilateration error: {e}")
-        
-        return None
+        return trilateration_solver.solve(tower_coords, distances)
     
-    async def weighted_centroid(
+    def weighted_centroid(
         self,
         cells: List[CellTowerData],
         tower_locations: Dict[int, Tuple[float, float]]
@@ -231,7 +517,7 @@ class PositioningEngine:
             logger.error(f"Weighted centroid error: {e}")
             return None, 0
     
-    async def crude_estimation_method(
+    def crude_estimation_method(
         self,
         cells: List[CellTowerData],
         tower_locations: Dict[int, Tuple[float, float]]
@@ -297,24 +583,51 @@ class PositioningEngine:
             logger.error(f"CEM error: {e}")
             return None, 0
     
-    def is_high_density(self, tower_locations: Dict[int, Tuple[float, float]]) -> bool:
+    def located_keys(
+        self,
+        cells: List[CellTowerData],
+        tower_locations: Dict[int, Tuple[float, float]]
+    ) -> List[Tuple[int, int, int, int]]:
+        """(mcc, mnc, lac, cid) of the cells whose tower was resolved"""
+        return [self.tower_key(cell) for cell in cells if cell.cid in tower_locations]
+    
+    def lookup_density(self, keys: List[Tuple[int, int, int, int]]) -> Optional[float]:
+        """
+        Mean stored neighbourhood density (meters) of the given towers
+        Returns None unless every tower has a stored density
+        """
+        
+        densities = [self.tower_density.get(key) for key in keys]
+        
+        if not densities or any(density is None for density in densities):
+            return None
+        
+        return sum(densities) / len(densities)
+    
+    def is_high_density(
+        self,
+        tower_locations: Dict[int, Tuple[float, float]],
+        tower_keys: Optional[List[Tuple[int, int, int, int]]] = None
+    ) -> bool:
         """Check if tower density is high (< 800m average separation)"""
         
         if len(tower_locations) < 2:
             return False
         
+        # Prefer the precomputed k-nearest-tower density index
+        density = self.lookup_density(tower_keys) if tower_keys else None
+        if density is not None:
+            return density < 800  # meters
+        
         try:
-            coords = list(tower_locations.values())
+            coords = np.array(list(tower_locations.values()), dtype=float)
             
             # Calculate average distance between all tower pairs
-            distances = []
-            for i in range(len(coords)):
-                for j in range(i + 1, len(coords)):
-                    dist = self.haversine_distance(
-                        coords[i][0], coords[i][1],
-                        coords[j][0], coords[j][1]
-                    )
-                    distances.append(dist)
+            i, j = np.triu_indices(len(coords), k=1)
+            distances = self.haversine_distances(
+                coords[i, 0], coords[i, 1],
+                coords[j, 0], coords[j, 1]
+            )
             
             avg_distance = np.mean(distances)
             
@@ -324,6 +637,13 @@ class PositioningEngine:
             logger.error(f"Density check error: {e}")
             return False
     
+    def get_stats(self) -> Dict:
+        """Get positioning cache counters"""
+        return {
+            "position_memo": self.position_memo.get_stats(),
+            "tower_density": self.tower_density.get_stats()
+        }
+    
     def haversine_distance(
         self,
         lat1: float,
@@ -349,6 +669,134 @@ class PositioningEngine:
         distance = self.EARTH_RADIUS * c
         
         return distance  # meters
+    
+    def haversine_distances(self, lat1, lon1, lat2, lon2) -> np.ndarray:
+        """Vectorized Haversine distance (meters) over broadcastable arrays"""
+        
+        lat1_rad = np.radians(lat1)
+        lat2_rad = np.radians(lat2)
+        delta_lat = lat2_rad - lat1_rad
+        delta_lon = np.radians(lon2) - np.radians(lon1)
+        
+        a = (np.sin(delta_lat / 2) ** 2 +
+             np.cos(lat1_rad) * np.cos(lat2_rad) *
+             np.sin(delta_lon / 2) ** 2)
+        
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        
+        return self.EARTH_RADIUS * c
+    
+    def _pad_rows(self, rows: List[List[Tuple]], width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pack ragged per-scan rows into a zero-padded (scans, max_rows, width)
+        array plus a boolean mask of the real entries
+        """
+        
+        max_rows = max((len(row) for row in rows), default=0)
+        values = np.zeros((len(rows), max_rows, width))
+        mask = np.zeros((len(rows), max_rows), dtype=bool)
+        
+        for i, row in enumerate(rows):
+            if row:
+                values[i, :len(row)] = row
+                mask[i, :len(row)] = True
+        
+        return values, mask
+    
+    def _batch_high_density(self, towers: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """Vectorized is_high_density over padded (scans, towers, 2) arrays"""
+        
+        lat, lon = towers[..., 0], towers[..., 1]
+        
+        # Pairwise distances between every tower pair of each scan
+        distances = self.haversine_distances(
+            lat[:, :, None], lon[:, :, None],
+            lat[:, None, :], lon[:, None, :]
+        )
+        pairs = mask[:, :, None] & mask[:, None, :]
+        pairs &= np.triu(np.ones(pairs.shape[1:], dtype=bool), k=1)
+        
+        counts = pairs.sum(axis=(1, 2))
+        totals = np.where(pairs, distances, 0).sum(axis=(1, 2))
+        avg_distance = totals / np.maximum(counts, 1)
+        
+        return (counts > 0) & (avg_distance < 800)  # meters
+    
+    def _batch_weighted_centroid(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        rssi: np.ndarray,
+        mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized weighted_centroid over padded (scans, cells) arrays"""
+        
+        max_rssi = np.where(mask, rssi, -np.inf).max(axis=1, keepdims=True)
+        base = np.where(mask, max_rssi - rssi + 1, 1)
+        weights = np.where(mask, 1 / base ** self.PATH_LOSS_EXPONENT, 0)
+        
+        total_weight = weights.sum(axis=1)
+        ok = total_weight > 0
+        total_weight = np.where(ok, total_weight, 1)
+        
+        positions = np.stack([
+            (weights * lat).sum(axis=1) / total_weight,
+            (weights * lon).sum(axis=1) / total_weight
+        ], axis=1)
+        
+        return positions, ok
+    
+    def _batch_crude_estimation(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        rssi: np.ndarray,
+        mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized crude_estimation_method over padded (scans, cells) arrays"""
+        
+        i, j = np.triu_indices(mask.shape[1], k=1)
+        pairs = mask[:, i] & mask[:, j]
+        
+        # Signal strength ratio and candidate along each tower pair
+        ratio = np.divide(
+            rssi[:, j], rssi[:, i],
+            out=np.ones(pairs.shape), where=rssi[:, i] != 0
+        )
+        weight = 1 / (1 + np.abs(ratio))
+        candidates = np.stack([
+            weight * lat[:, i] + (1 - weight) * lat[:, j],
+            weight * lon[:, i] + (1 - weight) * lon[:, j]
+        ], axis=2)
+        
+        counts = pairs.sum(axis=1)
+        ok = counts > 0
+        
+        # Statistical filtering: remove outliers beyond ±1σ
+        selected = pairs[:, :, None]
+        n = np.maximum(counts, 1)[:, None]
+        mean = np.where(selected, candidates, 0).sum(axis=1) / n
+        deviation = np.abs(candidates - mean[:, None, :])
+        std = np.sqrt(np.where(selected, deviation ** 2, 0).sum(axis=1) / n)
+        
+        filtered = pairs & (deviation <= std[:, None, :]).all(axis=2)
+        filtered = np.where(filtered.any(axis=1, keepdims=True), filtered, pairs)
+        
+        kept = filtered[:, :, None]
+        positions = (
+            np.where(kept, candidates, 0).sum(axis=1) /
+            np.maximum(filtered.sum(axis=1), 1)[:, None]
+        )
+        
+        return positions, ok
 
 # Global instance
 positioning_engine = PositioningEngine()
+
+def solve_position(cells, tower_locations, high_density):
+    """Compute pool entry point for PositioningEngine.solve_position"""
+    return positioning_engine.solve_position(cells, tower_locations, high_density)
+
+def solve_positions_batch(scans, tower_locations, densities):
+    """Compute pool entry point for PositioningEngine.solve_positions_batch"""
+    return positioning_engine.solve_positions_batch(scans, tower_locations, densities)
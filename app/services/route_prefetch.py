@@ -0,0 +1,190 @@
+"""
+Route Corridor Prefetcher
+Keeps the towers along every route with live vehicles warm in the tower
+lookup cache, since the cells a bus reports next are the ones along its route
+"""
+import asyncio
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.database import mongodb
+from app.services.live_positions import live_positions
+from app.services.opencellid import TOWER_PROJECTION, opencellid_service
+from app.services.route_tracking import route_tracking_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RoutePrefetcher:
+    """
+    Loads the towers within a buffer of each active route's stops and paths,
+    again every interval while the route stays active
+    """
+    
+    def __init__(self):
+        self.EARTH_RADIUS = 6378100  # meters, as used by $centerSphere
+        self.QUERY_POINTS = 50  # corridor points per MongoDB query
+        self.POLL_SECONDS = 30  # how soon a newly active route is prefetched
+        
+        self.buffer_meters = settings.ROUTE_PREFETCH_BUFFER_METERS
+        self.task: Optional[asyncio.Task] = None
+        self.prefetched: Dict[str, float] = {}  # route_id -> monotonic time of last prefetch
+        
+        self.runs = 0
+        self.routes = 0
+        self.towers = 0
+        self.last_run: Optional[datetime] = None
+    
+    def start(self):
+        """Start the background refresh loop"""
+        if settings.ROUTE_PREFETCH_ENABLED and self.task is None:
+            self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    async def run(self):
+        """
+        Poll for active routes; each is re-prefetched every interval so its
+        corridor stays inside the cache TTL
+        """
+        while True:
+            # One failed pass must not stop prefetching for the life of the process
+            try:
+                await self.prefetch_all()
+            except Exception as e:
+                logger.error(f"Route prefetch error: {e}")
+            await asyncio.sleep(self.POLL_SECONDS)
+    
+    async def prefetch_all(self) -> int:
+        """
+        Prefetch the corridors of active routes not prefetched within the interval
+        Returns: number of towers cached
+        """
+        
+        if mongodb.db is None:
+            return 0
+        
+        active = await live_positions.active_routes()
+        
+        # Routes that went idle are prefetched again as soon as they return
+        self.prefetched = {route_id: at for route_id, at in self.prefetched.items() if route_id in active}
+        
+        now = time.monotonic()
+        due = {
+            route_id for route_id in active
+            if now - self.prefetched.get(route_id, float("-inf")) >= settings.ROUTE_PREFETCH_INTERVAL_SECONDS
+        }
+        if not due:
+            return 0
+        
+        routes = await self.route_corridors(due)
+        total = 0
+        for points in routes.values():
+            total += await self.prefetch_corridor(points)
+        
+        # Unknown routes too, so they aren't looked up on every poll
+        self.prefetched.update({route_id: now for route_id in due})
+        
+        self.runs += 1
+        self.routes = len(self.prefetched)
+        self.towers += total
+        self.last_run = datetime.utcnow()
+        logger.info(f"Prefetched {total} towers along {len(routes)} routes")
+        
+        return total
+    
+    async def route_corridors(self, route_ids: Set[str]) -> Dict[str, List[Tuple[float, float]]]:
+        """Corridor points (lat, lon) of the given routes, built-in or from the routes collection"""
+        
+        routes = {
+            route_id: self.corridor_points([(stop["lat"], stop["lon"]) for stop in route["stops"]])
+            for route_id, route in route_tracking_service.routes.items()
+            if route_id in route_ids
+        }
+        
+        try:
+            async for route in mongodb.db.routes.find(
+                {"route_id": {"$in": list(route_ids)}},
+                {"route_id": 1, "stops": 1, "segments": 1}
+            ):
+                # Straight stop-to-stop lines, plus the recorded segment paths when present
+                points = self.corridor_points(
+                    [(stop["lat"], stop["lon"]) for stop in route.get("stops", [])]
+                )
+                for segment in route.get("segments", []):
+                    points.extend(
+                        self.corridor_points([(p["lat"], p["lon"]) for p in segment.get("path", [])])
+                    )
+                routes[route["route_id"]] = points
+        except Exception as e:
+            logger.error(f"Error loading routes for prefetch: {e}")
+        
+        return routes
+    
+    def corridor_points(self, line: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+        """
+        Points along a polyline spaced at most one buffer apart, so the
+        buffer circles around them cover the whole line
+        """
+        
+        if len(line) < 2:
+            return list(line)
+        
+        points = [line[0]]
+        for (lat1, lon1), (lat2, lon2) in zip(line, line[1:]):
+            steps = max(1, math.ceil(self.distance(lat1, lon1, lat2, lon2) / self.buffer_meters))
+            for step in range(1, steps + 1):
+                t = step / steps
+                points.append((lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t))
+        
+        return points
+    
+    async def prefetch_corridor(self, points: List[Tuple[float, float]]) -> int:
+        """Cache every known tower within the buffer of the given points"""
+        
+        radius = self.buffer_meters / self.EARTH_RADIUS  # radians
+        cached = set()
+        
+        try:
+            for i in range(0, len(points), self.QUERY_POINTS):
+                query = {"$or": [
+                    {"location": {"$geoWithin": {"$centerSphere": [[lon, lat], radius]}}}
+                    for lat, lon in points[i:i + self.QUERY_POINTS]
+                ]}
+                
+                async for tower in mongodb.db.towers.find(query, TOWER_PROJECTION):
+                    key = (tower["mcc"], tower["mnc"], tower["lac"], tower["cid"])
+                    if key not in cached and opencellid_service.remember_local(tower):
+                        cached.add(key)
+        
+        except Exception as e:
+            logger.error(f"Error prefetching route corridor: {e}")
+        
+        return len(cached)
+    
+    def distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """Equirectangular distance in meters (fine at corridor scale)"""
+        x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+        y = math.radians(lat2 - lat1)
+        return self.EARTH_RADIUS * math.hypot(x, y)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch counters"""
+        return {
+            "runs": self.runs,
+            "routes": self.routes,
+            "towers": self.towers,
+            "last_run": self.last_run.isoformat() if self.last_run else None
+        }
+
+# Global instance
+route_prefetcher = RoutePrefetcher()
@@ -0,0 +1,53 @@
+"""
+Single-flight Request Coalescing
+Concurrent callers for the same key share one in-flight call and its result
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Deduplicates concurrent async calls by key"""
+    
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Task] = {}
+        
+        self.calls = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() unless a call for key is already in flight, in which case
+        wait for that call's result instead
+        """
+        self.calls += 1
+        
+        task = self.in_flight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(fn())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        
+        # Shielded so one caller timing out doesn't cancel the shared call
+        return await asyncio.shield(task)
+    
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        """Forget a finished call"""
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        
+        # Mark the exception as retrieved if every caller has gone away
+        if not task.cancelled():
+            task.exception()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get coalescing counters"""
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.in_flight)
+        }
@@ -1,11 +1,18 @@
-import httpx
-from typing import Optional, Tuple, Dict, List
+from typing import Optional, Tuple, Dict
 from datetime import datetime
 from app.database import mongodb, redis_client
 from app.config import settings
-from app.models.schemas import CellTowerData
+from app.serialization import dumps, loads
+from app.services.http_client import http_client, opencellid_breaker
+from app.services.lru_cache import LRUCache
+from app.services.opencellid import is_cell_not_found
+from app.services.single_flight import SingleFlight
+from app.services.tower_density import tower_density
+from app.services.tower_events import tower_events
+from app.services.tower_index import tower_index
+from app.services.tower_table import tower_table
+from app.services.unknown_towers import unknown_towers
 import logging
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +21,27 @@ class TowerDatabase:
     
     def __init__(self):
         self.opencellid_url = "https://opencellid.org/cell/get"
-        self.cache = {}
+        
+        # L1: bounded in-process cache, checked before Redis (L2) and MongoDB (L3)
+        self.cache = LRUCache(
+            maxsize=settings.TOWER_CACHE_SIZE,
+            ttl=settings.TOWER_CACHE_TTL_SECONDS
+        )
+        self.redis_ttl = 86400  # 24 hours
+        
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.mongo_hits = 0
+        self.mongo_misses = 0
+        
+        # Coalesces concurrent upstream lookups of the same (mcc, mnc, lac, cid)
+        self.lookups = SingleFlight()
+        
+        # Drop towers any worker upserts so the next lookup re-reads them
+        tower_events.subscribe(self.invalidate)
+    
+    def invalidate(self, mcc: int, mnc: int, lac: int, cid: int):
+        self.cache.delete(f"tower:{mcc}:{mnc}:{lac}:{cid}")
     
     async def get_tower_location(
         self,
@@ -25,75 +52,111 @@ class TowerDatabase:
     ) -> Optional[Tuple[float, float]]:
         """
         Get tower location (lat, lon) with caching
-        Priority: Redis -> Local Cache -> MongoDB -> OpenCellID
+        Priority: Local Cache -> Offline Table -> Redis -> MongoDB -> OpenCellID
         """
         
         cache_key = f"tower:{mcc}:{mnc}:{lac}:{cid}"
         
-        # 1. Check Redis cache
+        # 1. Check local cache, then the offline tower table
+        location = self.cache.get(cache_key) or tower_table.lookup_location(mcc, mnc, lac, cid)
+        if location:
+            return location
+        
+        # Towers tombstoned in this process skip Redis, MongoDB and OpenCellID
+        if unknown_towers.is_unknown_local(mcc, mnc, lac, cid):
+            return await self.get_mock_tower_location(cid)
+        
+        # 2. Check Redis cache
         if redis_client.client:
             try:
                 cached = await redis_client.client.get(cache_key)
                 if cached:
-                    data = json.loads(cached)
-                    return (data['lat'], data['lon'])
+                    self.redis_hits += 1
+                    data = loads(cached)
+                    location = (data['lat'], data['lon'])
+                    self.cache.set(cache_key, location)
+                    return location
+                self.redis_misses += 1
             except Exception as e:
                 logger.debug(f"Redis cache miss: {e}")
         
-        # 2. Check local cache
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-        
         # 3. Check MongoDB
-        tower = await mongodb.db.towers.find_one({
-            "cid": cid,
-            "lac": lac,
-            "mcc": mcc,
-            "mnc": mnc
-        })
-        
-        if tower and 'location' in tower:
-            coords = tower['location']['coordinates']
-            location = (coords[1], coords[0])  # (lat, lon)
+        if mongodb.db is not None:
+            tower = await mongodb.db.towers.find_one({
+                "cid": cid,
+                "lac": lac,
+                "mcc": mcc,
+                "mnc": mnc
+            })
             
-            # Cache it
-            self.cache[cache_key] = location
-            if redis_client.client:
-                try:
-                    await redis_client.client.setex(
-                        cache_key,
-                        86400,  # 24 hours
-                        json.dumps({'lat': location[0], 'lon': location[1]})
-                    )
-                except Exception as e:
-                    logger.debug(f"Redis cache set error: {e}")
+            if tower and 'location' in tower:
+                self.mongo_hits += 1
+                coords = tower['location']['coordinates']
+                location = (coords[1], coords[0])  # (lat, lon)
+                
+                # Cache it
+                await self.cache_location(cache_key, location)
+                return location
             
-            return location
+            self.mongo_misses += 1
+        
+        return await self.resolve_upstream(cid, lac, mcc, mnc)
+    
+    async def resolve_upstream(
+        self,
+        cid: int,
+        lac: int,
+        mcc: int,
+        mnc: int
+    ) -> Optional[Tuple[float, float]]:
+        """Resolve a tower missing from every cache tier: OpenCellID -> mock data"""
         
-        # 4. Query OpenCellID (if API key available)
-        if settings.OPENCELLID_API_KEY:
-            location = await self.query_opencellid(cid, lac, mcc, mnc)
+        # 4. Query OpenCellID (if API key available and not a known unknown)
+        if settings.OPENCELLID_API_KEY and not await unknown_towers.is_unknown(mcc, mnc, lac, cid):
+            # One shared request per tower across concurrent callers
+            location = await self.lookups.do(
+                (mcc, mnc, lac, cid),
+                lambda: self.fetch_from_opencellid(cid, lac, mcc, mnc)
+            )
             if location:
-                # Save to MongoDB
-                await self.save_tower(cid, lac, mcc, mnc, location[0], location[1])
-                
                 # Cache it
-                self.cache[cache_key] = location
-                if redis_client.client:
-                    try:
-                        await redis_client.client.setex(
-                            cache_key,
-                            86400,
-                            json.dumps({'lat': location[0], 'lon': location[1]})
-                        )
-                    except Exception as e:
-                        logger.debug(f"Redis cache set error: {e}")
-                
+                await self.cache_location(f"tower:{mcc}:{mnc}:{lac}:{cid}", location)
                 return location
         
         # 5. Use mock tower data for demo (Knowledge Park)
         return await self.get_mock_tower_location(cid)
     
+    async def cache_location(self, cache_key: str, location: Tuple[float, float]):
+        """Store a tower location in the local cache and Redis"""
+        
+        self.cache.set(cache_key, location)
+        
+        if redis_client.client:
+            try:
+                await redis_client.client.setex(
+                    cache_key,
+                    self.redis_ttl,
+                    dumps({'lat': location[0], 'lon': location[1]})
+                )
+            except Exception as e:
+                logger.debug(f"Redis cache set error: {e}")
+    
+    async def fetch_from_opencellid(
+        self,
+        cid: int,
+        lac: int,
+        mcc: int,
+        mnc: int
+    ) -> Optional[Tuple[float, float]]:
+        """Query OpenCellID and save the tower to MongoDB"""
+        
+        location = await self.query_opencellid(cid, lac, mcc, mnc)
+        if location:
+            await unknown_towers.clear(mcc, mnc, lac, cid)
+            await self.save_tower(cid, lac, mcc, mnc, location[0], location[1])
+        
+        return location
+    
     async def query_opencellid(
         self,
         cid: int,
@@ -103,23 +166,35 @@ class TowerDatabase:
     ) -> Optional[Tuple[float, float]]:
         """Query OpenCellID API for tower location"""
         
+        params = {
+            "key": settings.OPENCELLID_API_KEY,
+            "mcc": mcc,
+            "mnc": mnc,
+            "lac": lac,
+            "cellid": cid,
+            "format": "json"
+        }
+        
+        # Shared connection pool; None when the circuit is open or the request failed
+        response = await http_client.get(self.opencellid_url, opencellid_breaker, params=params)
+        if response is None:
+            return None
+        
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "key": settings.OPENCELLID_API_KEY,
-                    "mcc": mcc,
-                    "mnc": mnc,
-                    "lac": lac,
-                    "cellid": cid,
-                    "format": "json"
-                }
-                
-                response = await client.get(self.opencellid_url, params=params, timeout=5.0)
+            if response.status_code == 200:
+                data = response.json()
+                if 'lat' in data and 'lon' in data:
+                    return (float(data['lat']), float(data['lon']))
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    if 'lat' in data and 'lon' in data:
-                        return (float(data['lat']), float(data['lon']))
+                # Only a genuine "cell not found" is tombstoned, not key or quota errors
+                if is_cell_not_found(data):
+                    await unknown_towers.mark_unknown(mcc, mnc, lac, cid)
+                else:
+                    logger.warning(f"OpenCellID error response: {data}")
+            
+            # Tower unknown to OpenCellID (not a transient failure)
+            elif response.status_code == 404:
+                await unknown_towers.mark_unknown(mcc, mnc, lac, cid)
         
         except Exception as e:
             logger.warning(f"OpenCellID query failed: {e}")
@@ -158,6 +233,10 @@ class TowerDatabase:
             
             logger.info(f"Saved tower: CID={cid}, LAC={lac}")
             
+            tower_index.upsert(tower_doc)
+            await tower_events.publish(mcc, mnc, lac, cid)
+            tower_density.schedule(mcc, mnc, lac, cid, lat, lon)
+            
         except Exception as e:
             logger.error(f"Error saving tower: {e}")
     
@@ -180,25 +259,25 @@ class TowerDatabase:
         
         return None
     
-    async def get_tower_locations_bulk(
-        self,
-        cells: List[CellTowerData]
-    ) -> Dict[int, Tuple[float, float]]:
-        """Get locations for multiple towers at once"""
-        
-        locations = {}
-        
-        for cell in cells:
-            location = await self.get_tower_location(
-                cell.cid,
-                cell.lac,
-                cell.mcc,
-                cell.mnc
-            )
-            if location:
-                locations[cell.cid] = location
-        
-        return locations
+    def get_stats(self) -> Dict:
+        """Get lookup counters"""
+        redis_lookups = self.redis_hits + self.redis_misses
+        mongo_lookups = self.mongo_hits + self.mongo_misses
+        return {
+            "local_cache": self.cache.get_stats(),
+            "redis": {
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "hit_ratio": round(self.redis_hits / redis_lookups, 4) if redis_lookups else 0.0
+            },
+            "mongodb": {
+                "hits": self.mongo_hits,
+                "misses": self.mongo_misses,
+                "hit_ratio": round(self.mongo_hits / mongo_lookups, 4) if mongo_lookups else 0.0
+            },
+            "lookups": self.lookups.get_stats(),
+            "invalidations": tower_events.get_stats()
+        }
 
 # Global instance
 tower_db = TowerDatabase()
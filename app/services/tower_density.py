@@ -0,0 +1,122 @@
+"""
+Tower Density Index
+Stores each tower's neighbourhood density (mean distance to its k nearest
+known towers) on the tower document, using the towers 2dsphere index
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Set
+from app.config import settings
+from app.database import mongodb
+from app.services.tower_events import tower_events
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TowerDensityIndex:
+    """Computes and stores per-tower density via $geoNear on the towers collection"""
+    
+    def __init__(self):
+        self.k_nearest = settings.TOWER_DENSITY_K
+        self.update_tasks: Set[asyncio.Task] = set()
+    
+    def schedule(self, mcc: int, mnc: int, lac: int, cid: int, lat: float, lon: float):
+        """Refresh a newly written tower's density in the background, off the lookup path"""
+        task = asyncio.create_task(self.update_tower(mcc, mnc, lac, cid, lat, lon))
+        self.update_tasks.add(task)
+        task.add_done_callback(self.update_tasks.discard)
+    
+    async def nearest_towers(
+        self,
+        lat: float,
+        lon: float,
+        exclude: Dict[str, int]
+    ) -> List[Dict[str, Any]]:
+        """Get the k nearest known towers (with distance in meters), excluding one tower"""
+        
+        if mongodb.db is None:
+            return []
+        
+        pipeline = [
+            {
+                "$geoNear": {
+                    "near": {"type": "Point", "coordinates": [lon, lat]},
+                    "distanceField": "distance",
+                    "spherical": True,
+                    "key": "location",
+                    "query": {"$nor": [exclude]}
+                }
+            },
+            {"$limit": self.k_nearest},
+            {"$project": {"mcc": 1, "mnc": 1, "lac": 1, "cid": 1, "location": 1, "distance": 1}}
+        ]
+        
+        return await mongodb.db.towers.aggregate(pipeline).to_list(length=self.k_nearest)
+    
+    async def compute_density(
+        self,
+        mcc: int,
+        mnc: int,
+        lac: int,
+        cid: int,
+        lat: float,
+        lon: float
+    ) -> Optional[float]:
+        """Mean distance (meters) from a tower to its k nearest known towers"""
+        
+        neighbours = await self.nearest_towers(
+            lat, lon, {"mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid}
+        )
+        
+        if not neighbours:
+            return None
+        
+        return sum(n["distance"] for n in neighbours) / len(neighbours)
+    
+    async def update_tower(
+        self,
+        mcc: int,
+        mnc: int,
+        lac: int,
+        cid: int,
+        lat: float,
+        lon: float
+    ) -> Optional[float]:
+        """
+        Store density on a newly written tower and refresh its k nearest
+        neighbours, whose neighbourhood just changed
+        Returns: the tower's density in meters
+        """
+        try:
+            key = {"mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid}
+            neighbours = await self.nearest_towers(lat, lon, key)
+            
+            if not neighbours:
+                return None
+            
+            density = sum(n["distance"] for n in neighbours) / len(neighbours)
+            await mongodb.db.towers.update_one(key, {"$set": {"density_m": density}})
+            
+            # Cached copies were written before the density existed
+            await tower_events.publish(mcc, mnc, lac, cid)
+            
+            for neighbour in neighbours:
+                neighbour_key = {field: neighbour.get(field) for field in ("mcc", "mnc", "lac", "cid")}
+                neighbour_lon, neighbour_lat = neighbour["location"]["coordinates"]
+                
+                neighbour_density = await self.compute_density(
+                    **neighbour_key, lat=neighbour_lat, lon=neighbour_lon
+                )
+                if neighbour_density is not None:
+                    await mongodb.db.towers.update_one(
+                        {"_id": neighbour["_id"]},
+                        {"$set": {"density_m": neighbour_density}}
+                    )
+            
+            return density
+        
+        except Exception as e:
+            logger.error(f"Error updating tower density: {e}")
+            return None
+
+# Global instance
+tower_density = TowerDensityIndex()
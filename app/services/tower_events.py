@@ -0,0 +1,115 @@
+"""
+Tower Update Events
+Redis pub/sub fan-out of tower upserts so every worker drops its stale
+in-process copy of a tower
+"""
+import asyncio
+import uuid
+from typing import Callable, List, Optional
+from app.database import redis_client
+from app.serialization import dumps, loads
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "tower:invalidate"
+
+class TowerEvents:
+    """Publishes tower upserts and dispatches them to local handlers"""
+    
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.handlers: List[Callable[[int, int, int, int], None]] = []
+        self.listen_task: Optional[asyncio.Task] = None
+        
+        self.published = 0
+        self.received = 0
+    
+    def subscribe(self, handler: Callable[[int, int, int, int], None]):
+        """Call handler(mcc, mnc, lac, cid) whenever any worker upserts a tower"""
+        self.handlers.append(handler)
+    
+    def start(self):
+        """Start listening for other workers' upserts"""
+        if redis_client.client and self.listen_task is None:
+            self.listen_task = asyncio.create_task(self.listen())
+    
+    async def stop(self):
+        if self.listen_task:
+            self.listen_task.cancel()
+            try:
+                await self.listen_task
+            except asyncio.CancelledError:
+                pass
+            self.listen_task = None
+    
+    async def publish(self, mcc: int, mnc: int, lac: int, cid: int):
+        """
+        Announce a tower upsert
+        Local handlers run immediately; the shared Redis copy is dropped so
+        every worker re-reads the new location
+        """
+        
+        self.dispatch(mcc, mnc, lac, cid)
+        
+        if not redis_client.client:
+            return
+        
+        try:
+            pipe = redis_client.client.pipeline(transaction=False)
+            pipe.delete(f"tower:{mcc}:{mnc}:{lac}:{cid}")
+            pipe.publish(CHANNEL, dumps({
+                "origin": self.worker_id,
+                "mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid
+            }))
+            await pipe.execute()
+            self.published += 1
+        except Exception as e:
+            logger.debug(f"Tower invalidation publish error: {e}")
+    
+    async def listen(self):
+        """Apply upserts published by other workers, resubscribing after errors"""
+        
+        while True:
+            pubsub = redis_client.client.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    
+                    event = loads(message["data"])
+                    if event.get("origin") == self.worker_id:
+                        continue
+                    
+                    self.received += 1
+                    self.dispatch(event["mcc"], event["mnc"], event["lac"], event["cid"])
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Tower invalidation listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    
+    def dispatch(self, mcc: int, mnc: int, lac: int, cid: int):
+        for handler in self.handlers:
+            try:
+                handler(mcc, mnc, lac, cid)
+            except Exception as e:
+                logger.error(f"Tower invalidation handler error: {e}")
+    
+    def get_stats(self):
+        """Get pub/sub counters"""
+        return {
+            "listening": self.listen_task is not None and not self.listen_task.done(),
+            "published": self.published,
+            "received": self.received
+        }
+
+# Global instance
+tower_events = TowerEvents()
@@ -0,0 +1,196 @@
+"""
+Tower Spatial Index
+In-process grid index over the tower set for radius and k-nearest queries
+"""
+import asyncio
+import heapq
+import math
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.database import mongodb
+from app.services.tower_events import tower_events
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TowerSpatialIndex:
+    """
+    Buckets towers into a lat/lon grid; queries scan only the buckets that
+    overlap the search circle
+    """
+    
+    def __init__(self):
+        self.EARTH_RADIUS = 6371000  # meters
+        self.METERS_PER_DEGREE = self.EARTH_RADIUS * math.pi / 180
+        self.cell_degrees = settings.TOWER_INDEX_CELL_DEGREES
+        
+        self.towers: Dict[Tuple[int, int, int, int], Tuple[float, float, Dict[str, Any]]] = {}
+        self.buckets: Dict[Tuple[int, int], Set[Tuple[int, int, int, int]]] = {}
+        
+        self.loaded = False
+        self.load_task: Optional[asyncio.Task] = None
+        self.refresh_tasks: Set[asyncio.Task] = set()
+        self.queries = 0
+        
+        tower_events.subscribe(self.invalidate)
+    
+    def start(self):
+        """Load the tower set from MongoDB in the background"""
+        if settings.TOWER_INDEX_ENABLED and self.load_task is None:
+            self.load_task = asyncio.create_task(self.load())
+    
+    async def stop(self):
+        """Cancel a load still in progress"""
+        if self.load_task and not self.load_task.done():
+            self.load_task.cancel()
+            try:
+                await self.load_task
+            except asyncio.CancelledError:
+                pass
+    
+    async def load(self):
+        """Index every tower with a location"""
+        
+        if mongodb.db is None:
+            logger.warning("MongoDB not connected, tower index not loaded")
+            return
+        
+        try:
+            count = 0
+            async for tower in mongodb.db.towers.find({"location": {"$exists": True}}):
+                self.upsert(tower)
+                count += 1
+            
+            self.loaded = True
+            logger.info(f"Tower index loaded: {count} towers")
+        
+        except Exception as e:
+            logger.error(f"Error loading tower index: {e}")
+    
+    def invalidate(self, mcc: int, mnc: int, lac: int, cid: int):
+        """Re-read an upserted tower from MongoDB"""
+        if self.loaded:
+            task = asyncio.create_task(self.refresh(mcc, mnc, lac, cid))
+            self.refresh_tasks.add(task)
+            task.add_done_callback(self.refresh_tasks.discard)
+    
+    async def refresh(self, mcc: int, mnc: int, lac: int, cid: int):
+        try:
+            tower = await mongodb.db.towers.find_one(
+                {"mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid}
+            )
+            if tower:
+                self.upsert(tower)
+        except Exception as e:
+            logger.debug(f"Error refreshing indexed tower: {e}")
+    
+    def bucket(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+    
+    def upsert(self, tower: Dict[str, Any]):
+        """Add or move a tower (a towers collection document)"""
+        
+        try:
+            key = (tower["mcc"], tower["mnc"], tower["lac"], tower["cid"])
+            lon, lat = tower["location"]["coordinates"]
+        except (KeyError, TypeError, ValueError):
+            return
+        
+        # Served as-is by /towers/nearby, so keep the same shape as the MongoDB fallback
+        tower = dict(tower)
+        if "_id" in tower:
+            tower["_id"] = str(tower["_id"])
+        
+        # Writes are partial ($set), so merge onto what's already indexed
+        previous = self.towers.get(key)
+        if previous:
+            tower = {**previous[2], **tower}
+            old_bucket = self.bucket(previous[0], previous[1])
+            self.buckets.get(old_bucket, set()).discard(key)
+        
+        self.towers[key] = (lat, lon, tower)
+        self.buckets.setdefault(self.bucket(lat, lon), set()).add(key)
+    
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_meters: float,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Towers within radius_meters, nearest first"""
+        
+        self.queries += 1
+        
+        dlat = radius_meters / self.METERS_PER_DEGREE
+        dlon = radius_meters / (self.METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        min_bucket = self.bucket(lat - dlat, lon - dlon)
+        max_bucket = self.bucket(lat + dlat, lon + dlon)
+        
+        # Wide boxes are mostly empty: walk the populated buckets instead
+        box_size = (max_bucket[0] - min_bucket[0] + 1) * (max_bucket[1] - min_bucket[1] + 1)
+        if box_size > len(self.buckets):
+            buckets = [
+                bucket for bucket in self.buckets
+                if min_bucket[0] <= bucket[0] <= max_bucket[0]
+                and min_bucket[1] <= bucket[1] <= max_bucket[1]
+            ]
+        else:
+            buckets = [
+                (i, j)
+                for i in range(min_bucket[0], max_bucket[0] + 1)
+                for j in range(min_bucket[1], max_bucket[1] + 1)
+            ]
+        
+        matches = []
+        for bucket in buckets:
+            for key in self.buckets.get(bucket, ()):
+                tower_lat, tower_lon, tower = self.towers[key]
+                distance = self.haversine_distance(lat, lon, tower_lat, tower_lon)
+                if distance <= radius_meters:
+                    matches.append((distance, key))
+        
+        if limit is not None:
+            matches = heapq.nsmallest(max(limit, 0), matches)
+        else:
+            matches.sort()
+        
+        return [dict(self.towers[key][2]) for distance, key in matches]
+    
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        max_radius_meters: float
+    ) -> List[Dict[str, Any]]:
+        """The k nearest towers within max_radius_meters, growing the search circle"""
+        
+        radius = self.cell_degrees * self.METERS_PER_DEGREE
+        while True:
+            radius = min(radius, max_radius_meters)
+            towers = self.within_radius(lat, lon, radius, limit=k)
+            if len(towers) >= k or radius >= max_radius_meters:
+                return towers
+            radius *= 2
+    
+    def haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """Distance in meters"""
+        lat1_rad = math.radians(lat1)
+        lat2_rad = math.radians(lat2)
+        a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2 +
+             math.cos(lat1_rad) * math.cos(lat2_rad) *
+             math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+        return self.EARTH_RADIUS * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index counters"""
+        return {
+            "loaded": self.loaded,
+            "towers": len(self.towers),
+            "buckets": len(self.buckets),
+            "queries": self.queries
+        }
+
+# Global instance
+tower_index = TowerSpatialIndex()
@@ -0,0 +1,248 @@
+"""
+Offline Tower Table
+Compact, sorted, memory-mapped tower table built from the OpenCellID CSV
+export and searched by packed (mcc, mnc, lac, cid) key
+
+Build:
+    python -m app.services.tower_table cell_towers.csv.gz -o towers.bin --mcc 404 --mcc 405
+"""
+import argparse
+import csv
+import gzip
+import os
+import struct
+import time
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OCIDTB01"
+HEADER = struct.Struct("<8sQ")  # magic, tower count
+
+# Packed key layout (high -> low bits): mcc 10 | mnc 10 | lac 16 | cid 28
+MCC_BITS, MNC_BITS, LAC_BITS, CID_BITS = 10, 10, 16, 28
+
+# Column layout after the header, in file order
+COLUMNS = [
+    ("key", np.uint64),
+    ("lat", np.int32),  # microdegrees
+    ("lon", np.int32),  # microdegrees
+    ("range", np.uint32),  # meters
+    ("samples", np.uint32),
+    ("radio", np.uint8),
+]
+
+RADIO_CODES = {"GSM": 1, "UMTS": 2, "CDMA": 3, "LTE": 4, "NR": 5}
+RADIO_NAMES = {code: name for name, code in RADIO_CODES.items()}
+
+# Column order of the OpenCellID export when the file has no header row
+CSV_FIELDS = [
+    "radio", "mcc", "net", "area", "cell", "unit", "lon", "lat", "range",
+    "samples", "changeable", "created", "updated", "averageSignal"
+]
+
+def pack_key(mcc: int, mnc: int, lac: int, cid: int) -> Optional[int]:
+    """Pack a tower identity into a sortable 64-bit key (None if out of range)"""
+    if not (0 <= mcc < 1 << MCC_BITS and 0 <= mnc < 1 << MNC_BITS and
+            0 <= lac < 1 << LAC_BITS and 0 <= cid < 1 << CID_BITS):
+        return None
+    return (((mcc << MNC_BITS | mnc) << LAC_BITS | lac) << CID_BITS) | cid
+
+def column_offsets(count: int) -> List[Tuple[str, np.dtype, int]]:
+    """Byte offset of each column for a table of count towers"""
+    offsets = []
+    offset = HEADER.size
+    for name, dtype in COLUMNS:
+        offsets.append((name, np.dtype(dtype), offset))
+        offset += np.dtype(dtype).itemsize * count
+    return offsets
+
+class TowerTable:
+    """Read-only tower table, memory-mapped and shared through the page cache"""
+    
+    def __init__(self, path: str = "", reload_seconds: float = 60.0):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.columns: Optional[Dict[str, np.ndarray]] = None
+        self.count = 0
+        
+        # The file is only stat()ed when this passes, never on every lookup
+        self.next_check = 0.0
+        self.signature: Optional[Tuple[int, int]] = None  # (inode, mtime) of the mapped file
+        
+        self.lookups = 0
+        self.hits = 0
+        self.reloads = 0
+    
+    def open(self) -> bool:
+        """
+        Map the table file, re-mapping it when a rebuild replaced it
+        Returns: False when no table is available
+        """
+        
+        now = time.monotonic()
+        if now < self.next_check:
+            return self.columns is not None
+        self.next_check = now + self.reload_seconds
+        
+        if not self.path:
+            return False
+        
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return self.columns is not None  # Keep serving the mapped copy
+        
+        signature = (stat.st_ino, stat.st_mtime_ns)
+        if self.columns is not None and signature == self.signature:
+            return True
+        
+        try:
+            with open(self.path, "rb") as f:
+                magic, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"not a tower table: {self.path}")
+            
+            columns = {
+                name: np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+                for name, dtype, offset in column_offsets(count)
+            } if count else {name: np.zeros(0, dtype) for name, dtype in COLUMNS}
+            
+            if self.columns is not None:
+                self.reloads += 1
+            self.columns, self.count, self.signature = columns, count, signature
+            
+            logger.info(f"Tower table mapped: {count} towers from {self.path}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Failed to open tower table: {e}")
+            return self.columns is not None
+    
+    def lookup(self, mcc: int, mnc: int, lac: int, cid: int) -> Optional[Dict[str, Any]]:
+        """Binary search a tower; returns tower data like the OpenCellID API or None"""
+        
+        if not self.open():
+            return None
+        
+        key = pack_key(mcc, mnc, lac, cid)
+        if key is None:
+            return None
+        
+        self.lookups += 1
+        keys = self.columns["key"]
+        index = int(np.searchsorted(keys, np.uint64(key)))
+        
+        if index >= self.count or int(keys[index]) != key:
+            return None
+        
+        self.hits += 1
+        return {
+            "lat": int(self.columns["lat"][index]) / 1e6,
+            "lon": int(self.columns["lon"][index]) / 1e6,
+            "range": int(self.columns["range"][index]),
+            "samples": int(self.columns["samples"][index]),
+            "radio": RADIO_NAMES.get(int(self.columns["radio"][index]), "GSM"),
+            "source": "opencellid_dump"
+        }
+    
+    def lookup_location(self, mcc: int, mnc: int, lac: int, cid: int) -> Optional[Tuple[float, float]]:
+        """Binary search a tower; returns (lat, lon) or None"""
+        tower = self.lookup(mcc, mnc, lac, cid)
+        return (tower["lat"], tower["lon"]) if tower else None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get table counters"""
+        return {
+            "path": self.path,
+            "towers": self.count,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "reloads": self.reloads
+        }
+
+def read_rows(path: str) -> Iterable[Dict[str, str]]:
+    """Stream rows of an OpenCellID CSV export (plain or gzipped)"""
+    
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        first = f.readline()
+        has_header = "mcc" in first.lower()
+        fieldnames = next(csv.reader([first])) if has_header else CSV_FIELDS
+        
+        if not has_header:
+            yield dict(zip(fieldnames, next(csv.reader([first]))))
+        
+        yield from csv.DictReader(f, fieldnames=fieldnames)
+
+def build_table(paths: List[str], output: str, mccs: Optional[List[int]] = None) -> Dict[str, int]:
+    """
+    Build a sorted tower table from OpenCellID CSV exports
+    Duplicate keys keep the row with the most samples
+    Returns: import counters
+    """
+    
+    wanted = set(mccs) if mccs else None
+    columns = {name: [] for name, _ in COLUMNS}
+    stats = {"rows": 0, "imported": 0, "skipped": 0}
+    
+    for path in paths:
+        for row in read_rows(path):
+            stats["rows"] += 1
+            try:
+                mcc = int(row["mcc"])
+                if wanted and mcc not in wanted:
+                    continue
+                
+                key = pack_key(mcc, int(row["net"]), int(row["area"]), int(row["cell"]))
+                if key is None:
+                    stats["skipped"] += 1
+                    continue
+                
+                columns["key"].append(key)
+                columns["lat"].append(round(float(row["lat"]) * 1e6))
+                columns["lon"].append(round(float(row["lon"]) * 1e6))
+                columns["range"].append(max(int(float(row.get("range") or 0)), 0))
+                columns["samples"].append(max(int(row.get("samples") or 0), 0))
+                columns["radio"].append(RADIO_CODES.get((row.get("radio") or "").upper(), 0))
+                stats["imported"] += 1
+            
+            except (KeyError, TypeError, ValueError):
+                stats["skipped"] += 1
+    
+    arrays = {name: np.array(columns[name], dtype=dtype) for name, dtype in COLUMNS}
+    
+    # Sort by key, most samples last, then keep the last row of each key
+    order = np.lexsort((arrays["samples"], arrays["key"]))
+    keys = arrays["key"][order]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[:-1] != keys[1:]
+    order = order[last]
+    stats["towers"] = len(order)
+    
+    # Write to a temp file and swap it in, so mapped readers keep the old copy
+    temp = f"{output}.tmp"
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(order)))
+        for name, _ in COLUMNS:
+            f.write(arrays[name][order].tobytes())
+    os.replace(temp, output)
+    
+    return stats
+
+# Global instance
+tower_table = TowerTable(settings.OPENCELLID_TABLE_PATH, settings.OPENCELLID_TABLE_RELOAD_SECONDS)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the offline OpenCellID tower table")
+    parser.add_argument("csv", nargs="+", help="OpenCellID CSV export(s), optionally .gz")
+    parser.add_argument("-o", "--output", default=settings.OPENCELLID_TABLE_PATH or "towers.bin")
+    parser.add_argument("--mcc", type=int, action="append", help="Only import these MCCs (repeatable)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    result = build_table(args.csv, args.output, args.mcc)
+    logger.info(f"Tower table written to {args.output}: {result}")
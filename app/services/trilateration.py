@@ -0,0 +1,181 @@
+"""
+Trilateration Solver
+Fast TA trilateration in a local east/north plane with an analytic Jacobian
+"""
+import math
+import numpy as np
+from scipy.optimize import least_squares
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TrilaterationSolver:
+    """
+    Solves tower/distance trilateration:
+    1. Project towers onto a local plane around their centroid
+    2. Closed-form linear least squares for the initial fix
+    3. Gauss-Newton refinement with an analytic Jacobian
+    4. Levenberg-Marquardt fallback only if Gauss-Newton does not converge
+    """
+    
+    def __init__(self):
+        self.EARTH_RADIUS = 6371000  # meters
+        self.MAX_ITERATIONS = 20
+        self.STEP_TOLERANCE = 0.1  # meters
+        self.MIN_RANGE = 1e-6  # meters, guards the Jacobian at a tower
+    
+    def solve(
+        self,
+        tower_coords: List[List[float]],
+        distances: List[float]
+    ) -> Optional[List[float]]:
+        """
+        Solve for the position best matching the tower distances
+        Returns: [lat, lon] or None
+        """
+        try:
+            if len(tower_coords) < 3:
+                return None
+            
+            dists = [float(d) for d in distances]
+            origin, scale, points = self._project(tower_coords)
+            
+            x, y = self._linear_solution(points, dists)
+            (x, y), converged = self._gauss_newton(points, dists, (x, y))
+            
+            if not converged:
+                position = self._levenberg_marquardt(points, dists, (x, y))
+                if position is None:
+                    return None
+                x, y = position
+            
+            return [
+                float(origin[0] + y / scale[1]),
+                float(origin[1] + x / scale[0])
+            ]
+        
+        except Exception as e:
+            logger.error(f"Trilateration solver error: {e}")
+            return None
+    
+    def _project(
+        self,
+        tower_coords: List[List[float]]
+    ) -> Tuple[Tuple[float, float], Tuple[float, float], List[Tuple[float, float]]]:
+        """
+        Equirectangular projection of (lat, lon) pairs to local (east, north)
+        meters around the tower centroid
+        Returns: (origin, meters_per_degree, points)
+        """
+        n = len(tower_coords)
+        origin_lat = sum(tower[0] for tower in tower_coords) / n
+        origin_lon = sum(tower[1] for tower in tower_coords) / n
+        
+        meters_per_degree = self.EARTH_RADIUS * math.pi / 180
+        scale_east = meters_per_degree * math.cos(math.radians(origin_lat))
+        scale_north = meters_per_degree
+        
+        points = [
+            ((tower[1] - origin_lon) * scale_east, (tower[0] - origin_lat) * scale_north)
+            for tower in tower_coords
+        ]
+        
+        return (origin_lat, origin_lon), (scale_east, scale_north), points
+    
+    def _linear_solution(
+        self,
+        points: List[Tuple[float, float]],
+        dists: List[float]
+    ) -> Tuple[float, float]:
+        """
+        Closed-form initial fix: subtracting the last circle equation from the
+        others gives a linear system, solved through its 2x2 normal equations
+        """
+        (xr, yr), dr = points[-1], dists[-1]
+        reference_norm = xr * xr + yr * yr
+        
+        a11 = a12 = a22 = b1 = b2 = 0.0
+        for (xi, yi), di in zip(points[:-1], dists[:-1]):
+            ax, ay = 2 * (xi - xr), 2 * (yi - yr)
+            b = dr * dr - di * di + xi * xi + yi * yi - reference_norm
+            a11 += ax * ax
+            a12 += ax * ay
+            a22 += ay * ay
+            b1 += ax * b
+            b2 += ay * b
+        
+        det = a11 * a22 - a12 * a12
+        if abs(det) <= 1e-9 * max(a11 * a22, 1.0):
+            return 0.0, 0.0  # Collinear towers: start from the centroid
+        
+        return (a22 * b1 - a12 * b2) / det, (a11 * b2 - a12 * b1) / det
+    
+    def _gauss_newton(
+        self,
+        points: List[Tuple[float, float]],
+        dists: List[float],
+        position: Tuple[float, float]
+    ) -> Tuple[Tuple[float, float], bool]:
+        """Refine the position with Gauss-Newton steps (analytic Jacobian)"""
+        
+        x, y = position
+        
+        for _ in range(self.MAX_ITERATIONS):
+            # Accumulate J^T J and J^T r; Jacobian rows are unit vectors from each tower
+            a11 = a12 = a22 = g1 = g2 = 0.0
+            for (xi, yi), di in zip(points, dists):
+                dx, dy = x - xi, y - yi
+                r = max(math.hypot(dx, dy), self.MIN_RANGE)
+                ux, uy = dx / r, dy / r
+                residual = r - di
+                a11 += ux * ux
+                a12 += ux * uy
+                a22 += uy * uy
+                g1 += ux * residual
+                g2 += uy * residual
+            
+            det = a11 * a22 - a12 * a12
+            if not det > 1e-12:
+                return (x, y), False
+            
+            step_x = (a12 * g2 - a22 * g1) / det
+            step_y = (a12 * g1 - a11 * g2) / det
+            x, y = x + step_x, y + step_y
+            
+            if not (math.isfinite(x) and math.isfinite(y)):
+                return position, False
+            
+            if math.hypot(step_x, step_y) < self.STEP_TOLERANCE:
+                return (x, y), True
+        
+        return (x, y), False
+    
+    def _levenberg_marquardt(
+        self,
+        points: List[Tuple[float, float]],
+        dists: List[float],
+        position: Tuple[float, float]
+    ) -> Optional[Tuple[float, float]]:
+        """Full Levenberg-Marquardt solve, used when Gauss-Newton fails"""
+        
+        towers = np.asarray(points, dtype=float)
+        ranges_expected = np.asarray(dists, dtype=float)
+        
+        def residuals(p):
+            return np.linalg.norm(p - towers, axis=1) - ranges_expected
+        
+        def jacobian(p):
+            offsets = p - towers
+            ranges = np.maximum(np.linalg.norm(offsets, axis=1), self.MIN_RANGE)
+            return offsets / ranges[:, None]
+        
+        result = least_squares(residuals, np.asarray(position), jac=jacobian, method='lm')
+        
+        if result.success:
+            return float(result.x[0]), float(result.x[1])
+        
+        return None
+
+# Global instance
+trilateration_solver = TrilaterationSolver()
@@ -0,0 +1,157 @@
+"""
+Unknown Tower Cache
+Negative cache (tombstones) for towers OpenCellID doesn't know, stored
+in-process, in Redis and in MongoDB with an exponential re-check back-off
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database import mongodb, redis_client
+from app.services.lru_cache import LRUCache
+from app.services.tower_events import tower_events
+import logging
+
+logger = logging.getLogger(__name__)
+
+class UnknownTowerCache:
+    """Remembers unknown towers so they cost nothing until their next re-check"""
+    
+    def __init__(self):
+        self.base_ttl = settings.UNKNOWN_TOWER_BASE_TTL_SECONDS
+        self.max_ttl = settings.UNKNOWN_TOWER_MAX_TTL_SECONDS
+        self.local = LRUCache(maxsize=settings.UNKNOWN_TOWER_CACHE_SIZE)
+        
+        self.redis_hits = 0
+        self.mongo_hits = 0
+        self.marked = 0
+        self.cleared = 0
+        
+        # A tower another worker just found must not stay tombstoned here
+        tower_events.subscribe(self.invalidate)
+    
+    def invalidate(self, mcc: int, mnc: int, lac: int, cid: int):
+        self.local.delete((mcc, mnc, lac, cid))
+    
+    def backoff(self, misses: int) -> int:
+        """Seconds until the next re-check after this many consecutive misses"""
+        return int(min(self.base_ttl * 2 ** max(misses - 1, 0), self.max_ttl))
+    
+    def redis_key(self, mcc: int, mnc: int, lac: int, cid: int) -> str:
+        return f"tower:unknown:{mcc}:{mnc}:{lac}:{cid}"
+    
+    def is_unknown_local(self, mcc: int, mnc: int, lac: int, cid: int) -> bool:
+        """In-process tombstone check, cheap enough to run before any I/O"""
+        return self.local.get((mcc, mnc, lac, cid)) is not None
+    
+    async def is_unknown(self, mcc: int, mnc: int, lac: int, cid: int) -> bool:
+        """Check whether a tower has a live tombstone (in-process -> Redis -> MongoDB)"""
+        
+        key = (mcc, mnc, lac, cid)
+        
+        # 1. In-process
+        if self.is_unknown_local(*key):
+            return True
+        
+        # 2. Redis
+        if redis_client.client:
+            try:
+                redis_key = self.redis_key(*key)
+                pipe = redis_client.client.pipeline(transaction=False)
+                pipe.get(redis_key)
+                pipe.ttl(redis_key)
+                misses, ttl = await pipe.execute()
+                if misses is not None and ttl > 0:
+                    self.local.set(key, int(misses), ttl=ttl)
+                    self.redis_hits += 1
+                    return True
+            except Exception as e:
+                logger.debug(f"Redis unknown-tower lookup error: {e}")
+        
+        # 3. MongoDB
+        if mongodb.db is not None:
+            try:
+                tombstone = await mongodb.db.unknown_towers.find_one({
+                    "mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid,
+                    "retry_after": {"$gt": datetime.utcnow()}
+                })
+                if tombstone:
+                    ttl = (tombstone["retry_after"] - datetime.utcnow()).total_seconds()
+                    self.local.set(key, tombstone["misses"], ttl=ttl)
+                    self.mongo_hits += 1
+                    return True
+            except Exception as e:
+                logger.debug(f"MongoDB unknown-tower lookup error: {e}")
+        
+        return False
+    
+    async def mark_unknown(self, mcc: int, mnc: int, lac: int, cid: int):
+        """Record a miss and tombstone the tower with a growing back-off"""
+        
+        key = (mcc, mnc, lac, cid)
+        misses = 1
+        
+        try:
+            if mongodb.db is not None:
+                tombstone = await mongodb.db.unknown_towers.find_one_and_update(
+                    {"mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid},
+                    {"$inc": {"misses": 1}, "$set": {"last_miss": datetime.utcnow()}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                misses = tombstone["misses"]
+                
+                ttl = self.backoff(misses)
+                retry_after = datetime.utcnow() + timedelta(seconds=ttl)
+                await mongodb.db.unknown_towers.update_one(
+                    {"_id": tombstone["_id"]},
+                    {"$set": {
+                        "retry_after": retry_after,
+                        # Keep the miss count through one more re-check window
+                        "expires_at": retry_after + timedelta(seconds=self.max_ttl)
+                    }}
+                )
+        except Exception as e:
+            logger.error(f"Error saving unknown tower: {e}")
+        
+        ttl = self.backoff(misses)
+        self.local.set(key, misses, ttl=ttl)
+        
+        if redis_client.client:
+            try:
+                await redis_client.client.setex(self.redis_key(*key), ttl, misses)
+            except Exception as e:
+                logger.debug(f"Redis unknown-tower set error: {e}")
+        
+        self.marked += 1
+        logger.info(f"Tower {cid} marked unknown (miss {misses}, re-check in {ttl}s)")
+    
+    async def clear(self, mcc: int, mnc: int, lac: int, cid: int):
+        """Drop a tombstone once the tower has been found"""
+        
+        key = (mcc, mnc, lac, cid)
+        self.local.delete(key)
+        
+        try:
+            if redis_client.client:
+                await redis_client.client.delete(self.redis_key(*key))
+            if mongodb.db is not None:
+                result = await mongodb.db.unknown_towers.delete_one(
+                    {"mcc": mcc, "mnc": mnc, "lac": lac, "cid": cid}
+                )
+                self.cleared += result.deleted_count
+        except Exception as e:
+            logger.debug(f"Error clearing unknown tower: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get tombstone counters"""
+        return {
+            "local": self.local.get_stats(),
+            "redis_hits": self.redis_hits,
+            "mongo_hits": self.mongo_hits,
+            "marked": self.marked,
+            "cleared": self.cleared
+        }
+
+# Global instance
+unknown_towers = UnknownTowerCache()
@@ -1,35 +1,141 @@
 from fastapi import WebSocket
-from typing import List
-import json
+from typing import Dict, List, Optional
+from app.config import settings
+from app.serialization import dumps_str
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 class WebSocketManager:
-    """Manages WebSocket connections for real-time updates"""
+    """
+    Manages WebSocket connections for real-time updates
+    Ingest publishes onto an event bus and returns; a dispatcher task fans
+    each event out to per-connection queues drained by one sender task per
+    client, so slow or numerous viewers never hold up an upload
+    """
     
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        
+        self.events: Optional[asyncio.Queue] = None
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.outboxes: Dict[WebSocket, asyncio.Queue] = {}
+        self.senders: Dict[WebSocket, asyncio.Task] = {}
+        
+        self.published = 0
+        self.dropped_events = 0
+        self.dropped_messages = 0
+    
+    def start(self):
+        """Start the fan-out dispatcher"""
+        if self.dispatcher is None:
+            self.events = asyncio.Queue(maxsize=settings.WS_EVENT_QUEUE_SIZE)
+            self.dispatcher = asyncio.create_task(self.dispatch())
+            self.dispatcher.add_done_callback(self.dispatcher_done)
+    
+    def dispatcher_done(self, task: asyncio.Task):
+        """Restart the dispatcher if it crashed"""
+        if task is not self.dispatcher or task.cancelled():
+            return
+        logger.error(f"WebSocket dispatcher stopped, restarting: {task.exception()}")
+        self.dispatcher = asyncio.create_task(self.dispatch())
+        self.dispatcher.add_done_callback(self.dispatcher_done)
+    
+    async def stop(self):
+        """Stop the dispatcher and every sender task"""
+        tasks = list(self.senders.values())
+        if self.dispatcher:
+            tasks.append(self.dispatcher)
+            self.dispatcher = None
+        
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
     
     async def connect(self, websocket: WebSocket):
         """Accept new WebSocket connection"""
         await websocket.accept()
         self.active_connections.append(websocket)
+        
+        self.start()
+        self.outboxes[websocket] = asyncio.Queue(maxsize=settings.WS_CLIENT_QUEUE_SIZE)
+        self.senders[websocket] = asyncio.create_task(self.send_loop(websocket))
+        
         logger.info(f"New WebSocket connection. Total: {len(self.active_connections)}")
     
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        
+        self.outboxes.pop(websocket, None)
+        sender = self.senders.pop(websocket, None)
+        if sender and sender is not asyncio.current_task():
+            sender.cancel()
+        
         logger.info(f"WebSocket disconnected. Total: {len(self.active_connections)}")
     
+    def publish(self, message: dict):
+        """
+        Queue a message for every connected client without waiting
+        When the bus is full the oldest event is dropped
+        """
+        
+        if not self.active_connections:
+            return
+        
+        self.start()
+        self.published += 1
+        if self.events.full():
+            self.events.get_nowait()
+            self.dropped_events += 1
+        self.events.put_nowait(message)
+    
+    async def dispatch(self):
+        """Serialize each event once and hand it to every client's outbox"""
+        while True:
+            message = await self.events.get()
+            try:
+                message_json = dumps_str(message)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Dropping unserializable WebSocket event: {e}")
+                continue
+            
+            # One bad event must not stop every later broadcast
+            try:
+                for outbox in list(self.outboxes.values()):
+                    # A client that can't keep up loses its oldest updates
+                    if outbox.full():
+                        outbox.get_nowait()
+                        self.dropped_messages += 1
+                    outbox.put_nowait(message_json)
+            except Exception as e:
+                logger.error(f"Error dispatching WebSocket event: {e}")
+            
+            # Let the senders run between events
+            await asyncio.sleep(0)
+    
+    async def send_loop(self, websocket: WebSocket):
+        """Deliver one client's outbox in order"""
+        outbox = self.outboxes[websocket]
+        try:
+            while True:
+                message_json = await outbox.get()
+                await websocket.send_text(message_json)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error broadcasting to client: {e}")
+            self.disconnect(websocket)
+    
     async def broadcast(self, message: dict):
         """Broadcast message to all connected clients"""
         
         if not self.active_connections:
             return
         
-        message_json = json.dumps(message)
+        message_json = dumps_str(message)
         
         disconnected = []
         for connection in self.active_connections:
@@ -46,7 +152,7 @@ class WebSocketManager:
     async def send_personal(self, message: dict, websocket: WebSocket):
         """Send message to specific client"""
         try:
-            await websocket.send_text(json.dumps(message))
+            await websocket.send_text(dumps_str(message))
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
             self.disconnect(websocket)
@@ -54,6 +160,16 @@ class WebSocketManager:
     def get_connection_count(self) -> int:
         """Get number of active connections"""
         return len(self.active_connections)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get fan-out counters"""
+        return {
+            "connections": len(self.active_connections),
+            "published": self.published,
+            "queued_events": self.events.qsize() if self.events else 0,
+            "dropped_events": self.dropped_events,
+            "dropped_messages": self.dropped_messages
+        }
 
 # Global instance
 manager = WebSocketManager()
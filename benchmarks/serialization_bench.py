@@ -0,0 +1,105 @@
+"""
+Serialization benchmark
+Per-message encode/decode cost of stdlib json vs app.serialization (orjson)
+on the payloads the hot paths carry
+
+Run from the repository root: python benchmarks/serialization_bench.py
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from app.serialization import dumps, dumps_str, loads
+
+def websocket_frame():
+    return {
+        "vehicle_id": "BUS-101",
+        "route_id": "route_101",
+        "position": {"lat": 28.4657, "lon": 77.5009},
+        "accuracy": 400.0,
+        "method": "weighted_centroid",
+        "timestamp": "2026-01-01T00:00:00Z",
+        "current_stop": "Sector 18",
+        "next_stop": "Botanical Garden",
+        "eta_minutes": 4,
+        "progress": 0.42
+    }
+
+def cached_position():
+    return {
+        "vehicle_id": "BUS-101",
+        "route_id": "route_101",
+        "position": {"type": "Point", "coordinates": [77.5009, 28.4657]},
+        "accuracy": 400.0,
+        "method": "weighted_centroid",
+        "timestamp": "2026-01-01T00:00:00Z",
+        "timestamp_ms": 1767225600000,
+        "updated_at": 1767225600.123
+    }
+
+def history_page(size=500):
+    start = datetime(2026, 1, 1)
+    return {
+        "vehicle_id": "BUS-101",
+        "count": size,
+        "positions": [
+            {
+                "_id": f"{i:024x}",
+                "vehicle_id": "BUS-101",
+                "route_id": "route_101",
+                "timestamp": start + timedelta(seconds=10 * i),
+                "estimated_position": {"type": "Point", "coordinates": [77.5 + i * 1e-5, 28.46]},
+                "accuracy": 400.0,
+                "method": "weighted_centroid",
+                "device_type": "android",
+                "created_at": start + timedelta(seconds=10 * i + 1)
+            }
+            for i in range(size)
+        ],
+        "next": None
+    }
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=str)
+
+def bench(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    micros = seconds / number * 1e6
+    print(f"  {label:<10} {micros:10.2f} us/op")
+    return micros
+
+def main():
+    cases = [
+        ("websocket frame", websocket_frame(), 100000),
+        ("redis position", cached_position(), 100000),
+        ("history page (500)", history_page(), 100)
+    ]
+    
+    for name, payload, number in cases:
+        encoded = stdlib_dumps(payload)
+        print(f"{name} ({len(encoded)} bytes)")
+        
+        print(" encode")
+        before = bench("json", lambda: stdlib_dumps(payload), number)
+        after = bench("orjson", lambda: dumps_str(payload), number)
+        print(f"  {'speedup':<10} {before / after:10.1f}x")
+        
+        # What a dict returned from an endpoint used to cost
+        print(" response body")
+        before = bench("fastapi", lambda: json.dumps(jsonable_encoder(payload)).encode(), number)
+        after = bench("orjson", lambda: dumps(payload), number)
+        print(f"  {'speedup':<10} {before / after:10.1f}x")
+        
+        print(" decode")
+        raw = dumps(payload)
+        before = bench("json", lambda: json.loads(encoded), number)
+        after = bench("orjson", lambda: loads(raw), number)
+        print(f"  {'speedup':<10} {before / after:10.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,21 @@ import logging
 from app.database import mongodb, redis_client
 from app.api.routes import positions, routes, vehicles, towers
 from app.services.websocket_manager import manager
+from app.services.live_positions import live_positions
+from app.services.position_rollups import position_rollups
+from app.services.position_writer import position_writer
+from app.services.positioning import positioning_engine
+from app.services.route_prefetch import route_prefetcher
+from app.services.compute_pool import compute_pool
+from app.services.http_client import http_client
+from app.services.opencellid import opencellid_service
+from app.services.tower_database import tower_db
+from app.services.tower_events import tower_events
+from app.services.tower_index import tower_index
+from app.services.tower_table import tower_table
+from app.services.unknown_towers import unknown_towers
 from app.config import settings
+from app.serialization import JSONResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,12 +41,29 @@ async def lifespan(app: FastAPI):
     
     await mongodb.connect()
     await redis_client.connect()
+    http_client.start()
+    tower_table.open()
+    tower_index.start()
+    tower_events.start()
+    opencellid_service.start_warm_up()
+    route_prefetcher.start()
+    compute_pool.start()
+    position_writer.start()
+    manager.start()
     logger.info("✅ Backend startup complete!")
     
     yield
     
     # Shutdown
     logger.info("Shutting down backend...")
+    await position_writer.stop()
+    await manager.stop()
+    await compute_pool.shutdown()
+    await route_prefetcher.stop()
+    await opencellid_service.stop_warm_up()
+    await tower_events.stop()
+    await tower_index.stop()
+    await http_client.close()
     await mongodb.disconnect()
     await redis_client.disconnect()
     logger.info("Backend shutdown complete")
@@ -42,6 +73,7 @@ app = FastAPI(
     title="GPS-Free Vehicle Tracking Backend",
     description="Real-time vehicle tracking using cellular network metadata",
     version="1.0.0",
+    default_response_class=JSONResponse,
     lifespan=lifespan
 )
 
@@ -83,6 +115,25 @@ async def health_check():
         "redis": await redis_client.is_connected(),
     }
 
+# Runtime stats
+@app.get("/stats")
+async def stats():
+    """In-process cache and pipeline counters"""
+    return {
+        "positioning": positioning_engine.get_stats(),
+        "compute_pool": compute_pool.get_stats(),
+        "opencellid": opencellid_service.get_stats(),
+        "tower_database": tower_db.get_stats(),
+        "unknown_towers": unknown_towers.get_stats(),
+        "tower_table": tower_table.get_stats(),
+        "tower_index": tower_index.get_stats(),
+        "route_prefetch": route_prefetcher.get_stats(),
+        "position_writer": position_writer.get_stats(),
+        "position_rollups": position_rollups.get_stats(),
+        "live_positions": live_positions.get_stats(),
+        "websocket": manager.get_stats(),
+    }
+
 # Root endpoint
 @app.get("/")
 async def root():